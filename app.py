@@ -1,12 +1,21 @@
 import requests
-from flask import Flask, render_template, jsonify, request, session
+from flask import Flask, render_template, jsonify, request, session, Response, stream_with_context
 from ollama_client import OllamaClient
+from models import BUCKETS
+from scheduler import get_scheduler
+from gateway import get_gateway, GatewayError
+from response_cache import get_response_cache
+from coalescer import read_coalescer
+from inventory import get_inventory, filter_and_page, SORT_KEYS
+from embeddings import EmbeddingBatcher, iter_ndjson_texts
+from usage_export import UsageExport, EXPORT_FORMATS, parquet_available
 import traceback
 import os
 import json
 from translations import t, get_translation, set_language, get_available_languages, DEFAULT_LANGUAGE
 from bs4 import BeautifulSoup
 from functools import wraps
+from datetime import datetime, timezone
 
 app = Flask(__name__)
 # Use a more secure configuration for session cookies
@@ -18,6 +27,7 @@ app.config.update(
 )
 app.secret_key = os.environ.get('FLASK_SECRET_KEY', 'dev_key_123')  # Required for session
 ollama_client = OllamaClient()
+get_scheduler(ollama_client)  # starts the preload scheduler if its policy is enabled
 
 # Register translation function for templates
 app.jinja_env.globals.update(t=t)
@@ -129,10 +139,60 @@ def server_status():
 @app.route('/api/models', methods=['GET'])
 @with_error_handling
 def get_models():
+    """List models, either in full (optionally filtered, sorted and paged) or as a delta.
+
+    With since=<version> the response only holds the models added, changed
+    and removed since that version, unless the version is unknown, in
+    which case the full list is returned with "full": true. A delta
+    covers the whole list, so since cannot be combined with q, sort,
+    order, offset or limit.
+    """
+    since = request.args.get('since')
+    if since:
+        combined = [name for name in ('q', 'sort', 'order', 'offset', 'limit') if name in request.args]
+        if combined:
+            return jsonify({
+                'error': f'since cannot be combined with {", ".join(combined)}',
+                'status': 'validation_error'
+            }), 400
+
+    sort = request.args.get('sort')
+    order = request.args.get('order', 'asc')
+    if sort and sort not in SORT_KEYS:
+        return jsonify({
+            'error': f'Invalid sort. Available keys: {", ".join(SORT_KEYS)}',
+            'status': 'validation_error'
+        }), 400
+    if order not in ('asc', 'desc'):
+        return jsonify({'error': 'order must be "asc" or "desc"', 'status': 'validation_error'}), 400
+    try:
+        offset = int(request.args.get('offset', 0))
+        limit = int(request.args['limit']) if request.args.get('limit') else None
+    except ValueError:
+        return jsonify({'error': 'offset and limit must be integers', 'status': 'validation_error'}), 400
+    if offset < 0 or (limit is not None and limit < 0):
+        return jsonify({'error': 'offset and limit must not be negative', 'status': 'validation_error'}), 400
+
     response = ollama_client.list_models()
     if 'error' in response:
         return jsonify({'error': response['error']}), 503
-    return jsonify(response)
+
+    version, entries = get_inventory(ollama_client.base_url).record(response['models'])
+
+    if since:
+        delta = get_inventory(ollama_client.base_url).diff(since, version, entries)
+        if delta is not None:
+            return jsonify({'version': version, 'full': False, **delta})
+
+    models, total = filter_and_page(
+        response['models'],
+        query=request.args.get('q'),
+        sort=sort,
+        order=order,
+        offset=offset,
+        limit=limit
+    )
+    return jsonify({'models': models, 'version': version, 'full': True, 'total': total})
 
 @app.route('/api/models/running', methods=['GET'])
 @with_error_handling
@@ -211,6 +271,8 @@ def pull_model():
                 except json.JSONDecodeError:
                     continue
 
+        ollama_client._invalidate_reads()
+        get_response_cache().invalidate_model(ollama_client.base_url, model_name)
         return jsonify({'success': True, 'message': f'Successfully pulled model {model_name}'})
     except requests.exceptions.RequestException as e:
         return jsonify({'error': str(e)}), 500
@@ -297,10 +359,280 @@ def get_all_model_stats():
     stats = ollama_client.get_model_stats()
     return jsonify(stats)
 
+def parse_timestamp(value):
+    """Parse an ISO 8601 date or a Unix timestamp (seconds) into a naive UTC datetime"""
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        seconds = None
+    try:
+        if seconds is not None:
+            return datetime.utcfromtimestamp(seconds)
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed
+    except (OverflowError, OSError) as e:
+        raise ValueError(f'Timestamp out of range: {value}') from e
+
 @app.route('/api/models/<model_name>/stats', methods=['GET'])
 @with_error_handling
 def get_model_stats(model_name):
-    return jsonify(ollama_client.get_model_stats(model_name))
+    bucket = request.args.get('bucket')
+    if bucket and bucket not in BUCKETS:
+        return jsonify({
+            'error': f'Invalid bucket. Available buckets: {", ".join(BUCKETS)}',
+            'status': 'validation_error'
+        }), 400
+
+    try:
+        start = parse_timestamp(request.args.get('from'))
+        end = parse_timestamp(request.args.get('to'))
+    except ValueError as e:
+        return jsonify({'error': str(e), 'status': 'validation_error'}), 400
+
+    return jsonify(ollama_client.get_model_stats(model_name, start=start, end=end, bucket=bucket))
+
+@app.route('/api/usage/compact', methods=['POST'])
+@with_error_handling
+def compact_usage():
+    """Prune raw usage rows and fine-grained rollups past their retention age"""
+    removed = ollama_client.compact_usage()
+    return jsonify({'success': True, 'removed': removed})
+
+@app.route('/api/usage/export', methods=['GET'])
+@with_error_handling
+def export_usage():
+    """Stream raw usage rows as CSV, NDJSON or Parquet.
+
+    from/to and model filter the rows; after_id and since resume from the
+    watermark returned in the X-Export-Watermark-* headers of the previous
+    export, so incremental syncs only move new rows.
+    """
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({
+            'error': f'Invalid format. Available formats: {", ".join(EXPORT_FORMATS)}',
+            'status': 'validation_error'
+        }), 400
+    if export_format == 'parquet' and not parquet_available():
+        return jsonify({'error': 'Parquet export requires pyarrow', 'status': 'validation_error'}), 400
+
+    try:
+        start = parse_timestamp(request.args.get('from'))
+        end = parse_timestamp(request.args.get('to'))
+        since = parse_timestamp(request.args.get('since'))
+    except ValueError as e:
+        return jsonify({'error': str(e), 'status': 'validation_error'}), 400
+    try:
+        after_id = int(request.args.get('after_id', 0))
+        batch_size = int(request.args['batch_size']) if request.args.get('batch_size') else None
+    except ValueError:
+        return jsonify({'error': 'after_id and batch_size must be integers', 'status': 'validation_error'}), 400
+    if after_id < 0 or (batch_size is not None and batch_size <= 0):
+        return jsonify({
+            'error': 'after_id must not be negative and batch_size must be positive',
+            'status': 'validation_error'
+        }), 400
+
+    models = [name for name in request.args.get('model', '').split(',') if name]
+    export = UsageExport(
+        model_names=models or None,
+        start=start,
+        end=end,
+        after_id=after_id or None,
+        since=since,
+        batch_size=batch_size
+    )
+    return Response(
+        stream_with_context(export.iter_format(export_format)),
+        mimetype=EXPORT_FORMATS[export_format][0],
+        headers=export.headers(export_format)
+    )
+
+@app.route('/api/benchmarks', methods=['GET'])
+@with_error_handling
+def get_benchmarks():
+    models = [name for name in request.args.get('models', '').split(',') if name]
+    return jsonify({'results': ollama_client.get_benchmark_results(models or None)})
+
+@app.route('/api/benchmarks/run', methods=['POST'])
+@with_error_handling
+def run_benchmark():
+    if not request.is_json:
+        return jsonify({'error': 'Content-Type must be application/json'}), 400
+
+    data = request.json
+    models = data.get('models')
+    if not models:
+        return jsonify({
+            'error': t('select_models'),
+            'status': 'validation_error'
+        }), 400
+
+    results = ollama_client.run_benchmark(
+        models,
+        prompts=data.get('prompts'),
+        options=data.get('options'),
+        cold_start=data.get('cold_start', True)
+    )
+    return jsonify({'results': results})
+
+@app.route('/api/scheduler', methods=['GET'])
+@with_error_handling
+def get_scheduler_state():
+    """Current preload policy and the decisions of the last run"""
+    return jsonify(get_scheduler(ollama_client).get_state())
+
+@app.route('/api/scheduler/policy', methods=['POST'])
+@with_error_handling
+def update_scheduler_policy():
+    if not request.is_json:
+        return jsonify({'error': 'Content-Type must be application/json'}), 400
+
+    try:
+        policy = get_scheduler(ollama_client).update_policy(request.json)
+    except (KeyError, ValueError, TypeError) as e:
+        return jsonify({'error': f'Invalid policy: {str(e)}', 'status': 'validation_error'}), 400
+    return jsonify({'success': True, 'policy': policy})
+
+@app.route('/api/scheduler/run', methods=['POST'])
+@with_error_handling
+def run_scheduler():
+    """Run the preload scheduler now, or only preview its decisions with dry_run"""
+    dry_run = bool((request.get_json(silent=True) or {}).get('dry_run'))
+    decisions = get_scheduler(ollama_client).run(dry_run=dry_run)
+    return jsonify({'dry_run': dry_run, 'decisions': decisions})
+
+# Ollama inference endpoints that can be sent through the gateway
+PROXY_ENDPOINTS = ('generate', 'chat', 'embed', 'embeddings')
+
+@app.route('/api/proxy/<endpoint>', methods=['POST'])
+@with_error_handling
+def proxy_inference(endpoint):
+    """Forward an inference request to Ollama once the gateway admits it"""
+    if endpoint not in PROXY_ENDPOINTS:
+        return jsonify({'error': f'Unsupported endpoint: {endpoint}'}), 404
+    if not request.is_json:
+        return jsonify({'error': 'Content-Type must be application/json'}), 400
+
+    payload = request.json
+    model_name = payload.get('model')
+    if not model_name:
+        return jsonify({
+            'error': t('select_models'),
+            'status': 'validation_error'
+        }), 400
+
+    cache = get_response_cache()
+    cache_key = cache.make_key(ollama_client, endpoint, payload)
+    if cache_key:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            response = Response(cached, mimetype='application/x-ndjson')
+            response.headers['X-Cache'] = 'HIT'
+            return response
+
+    gateway = get_gateway(ollama_client)
+    try:
+        gateway.acquire(model_name)
+    except GatewayError as e:
+        response = jsonify({'error': str(e), 'status': 'queue_full' if e.status_code == 429 else 'queue_timeout'})
+        response.headers['Retry-After'] = '5'
+        return response, e.status_code
+
+    try:
+        lines = ollama_client.forward(f'api/{endpoint}', payload)
+    except Exception:
+        gateway.release(model_name)
+        raise
+
+    if cache_key:
+        lines = cache.record(cache_key, lines)
+
+    response = Response(stream_with_context(lines), mimetype='application/x-ndjson')
+    response.headers['X-Cache'] = 'MISS' if cache_key else 'BYPASS'
+    response.call_on_close(lambda: gateway.release(model_name))
+    return response
+
+@app.route('/api/cache/stats', methods=['GET'])
+@with_error_handling
+def get_cache_stats():
+    """Hit/miss counters of the response cache and of the coalesced reads"""
+    return jsonify({**get_response_cache().get_stats(), 'reads': read_coalescer.get_stats()})
+
+@app.route('/api/cache/clear', methods=['POST'])
+@with_error_handling
+def clear_cache():
+    get_response_cache().clear()
+    return jsonify({'success': True})
+
+@app.route('/api/embeddings/batch', methods=['POST'])
+@with_error_handling
+def embed_batch():
+    """Embed many texts, streamed back in input order as NDJSON or packed float32.
+
+    Accepts either a JSON body {"model", "input": [...]} or an NDJSON
+    upload (one text per line) with the model given as a query parameter.
+    """
+    if request.mimetype == 'application/x-ndjson':
+        options = request.args
+        texts = iter_ndjson_texts(request.stream)
+    elif request.is_json:
+        options = request.json
+        texts = options.get('input')
+        if isinstance(texts, str):
+            texts = [texts]
+        if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+            return jsonify({'error': '"input" must be a list of strings', 'status': 'validation_error'}), 400
+    else:
+        return jsonify({'error': 'Content-Type must be application/json or application/x-ndjson'}), 400
+
+    model_name = options.get('model')
+    if not model_name:
+        return jsonify({
+            'error': t('select_models'),
+            'status': 'validation_error'
+        }), 400
+
+    output_format = options.get('format', 'ndjson')
+    if output_format not in ('ndjson', 'float32'):
+        return jsonify({'error': 'format must be "ndjson" or "float32"', 'status': 'validation_error'}), 400
+
+    try:
+        batcher = EmbeddingBatcher(
+            ollama_client,
+            model_name,
+            gateway=get_gateway(ollama_client),
+            batch_size=int(options['batch_size']) if options.get('batch_size') else None,
+            concurrency=int(options['concurrency']) if options.get('concurrency') else None
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e), 'status': 'validation_error'}), 400
+
+    if output_format == 'float32':
+        return Response(stream_with_context(batcher.iter_float32(texts)), mimetype='application/octet-stream')
+    return Response(stream_with_context(batcher.iter_ndjson(texts)), mimetype='application/x-ndjson')
+
+@app.route('/api/gateway/stats', methods=['GET'])
+@with_error_handling
+def get_gateway_stats():
+    """Queue depth, active requests and wait times per model"""
+    return jsonify(get_gateway(ollama_client).get_stats())
+
+@app.route('/api/gateway/config', methods=['POST'])
+@with_error_handling
+def update_gateway_config():
+    if not request.is_json:
+        return jsonify({'error': 'Content-Type must be application/json'}), 400
+
+    try:
+        config = get_gateway(ollama_client).update_config(request.json)
+    except ValueError as e:
+        return jsonify({'error': str(e), 'status': 'validation_error'}), 400
+    return jsonify({'success': True, 'config': config})
 
 @app.route('/api/models/<model_name>/config', methods=['GET'])
 @with_error_handling
@@ -333,6 +665,38 @@ def save_model_config(model_name):
 
     return jsonify(result)
 
+@app.route('/api/models/config/batch', methods=['POST'])
+@with_error_handling
+def save_models_config_batch():
+    """Apply one configuration to several models, streaming progress as NDJSON"""
+    if not request.is_json:
+        return jsonify({'error': 'Content-Type must be application/json'}), 400
+
+    data = request.json
+    models = data.get('models')
+    if not models:
+        return jsonify({
+            'error': t('select_models'),
+            'status': 'validation_error'
+        }), 400
+    if not isinstance(models, list) or not all(isinstance(name, str) and name for name in models):
+        return jsonify({'error': 'models must be a list of model names', 'status': 'validation_error'}), 400
+    concurrency = data.get('concurrency', 4)
+    if not isinstance(concurrency, int) or isinstance(concurrency, bool) or concurrency < 1:
+        return jsonify({'error': 'concurrency must be a positive integer', 'status': 'validation_error'}), 400
+
+    events = ollama_client.apply_config_bulk(
+        models,
+        system=data.get('system'),
+        template=data.get('template'),
+        parameters=data.get('parameters'),
+        concurrency=concurrency
+    )
+    return Response(
+        stream_with_context(json.dumps(event) + '\n' for event in events),
+        mimetype='application/x-ndjson'
+    )
+
 @app.errorhandler(Exception)
 def handle_error(error):
     print(f"Unhandled error: {str(error)}")
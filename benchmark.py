@@ -0,0 +1,178 @@
+import requests
+from requests.exceptions import RequestException
+from models import BenchmarkResult, ModelUsage, normalize_model_name
+from urllib.parse import urlparse
+import threading
+import time
+import json
+
+# Prompts used when a benchmark request does not provide its own set
+DEFAULT_PROMPTS = [
+    "Explain in three sentences why the sky is blue.",
+    "Write a Python function that checks whether a string is a palindrome.",
+    "Summarize the plot of Romeo and Juliet in one paragraph."
+]
+
+# Fixed options so that runs are comparable between models
+DEFAULT_OPTIONS = {'temperature': 0, 'seed': 42, 'num_predict': 128}
+
+# Interval between two /api/ps samples while a benchmark is running
+VRAM_POLL_INTERVAL = 0.5
+
+
+class BenchmarkRunner:
+    """Run a prompt set against models through /api/generate and store the measurements"""
+
+    def __init__(self, client, prompts=None, options=None, cold_start=True):
+        self.client = client
+        self.prompts = prompts or DEFAULT_PROMPTS
+        self.options = {**DEFAULT_OPTIONS, **(options or {})}
+        self.cold_start = cold_start
+
+    @property
+    def host(self):
+        return urlparse(self.client.base_url).netloc or self.client.base_url
+
+    def run(self, model_names):
+        """Benchmark each model in turn, returning one result (or error) per model"""
+        digests = self._get_digests()
+        results = []
+        for model_name in map(normalize_model_name, model_names):
+            try:
+                result = self.run_model(model_name, digests.get(model_name))
+            except RequestException as e:
+                result = {'model_name': model_name, 'error': str(e)}
+            results.append(result)
+        return results
+
+    def run_model(self, model_name, digest=None):
+        model_name = normalize_model_name(model_name)
+        if self.cold_start:
+            # Unload the model so that the first prompt measures a cold load
+            self.client._handle_request(
+                requests.post,
+                'api/generate',
+                json={'model': model_name, 'prompt': '', 'keep_alive': '0s'}
+            )
+            self.client._invalidate_reads('api/ps')
+
+        sampler = _VramSampler(self.client, model_name)
+        sampler.start()
+        try:
+            runs = [self._run_prompt(model_name, prompt) for prompt in self.prompts]
+        finally:
+            sampler.stop()
+            # The benchmarked model is now loaded
+            self.client._invalidate_reads('api/ps')
+
+        for run in runs:
+            ModelUsage.log_usage(
+                model_name,
+                'benchmark',
+                run['prompt_eval_count'],
+                run['eval_count'],
+                run['total_duration']
+            )
+
+        warm_runs = runs[1:] or runs
+        prompt_eval_count = sum(run['prompt_eval_count'] for run in runs)
+        prompt_eval_duration = sum(run['prompt_eval_duration'] for run in runs)
+        eval_count = sum(run['eval_count'] for run in runs)
+        eval_duration = sum(run['eval_duration'] for run in runs)
+
+        return BenchmarkResult.save_result(
+            model_name=model_name,
+            model_digest=digest or '',
+            host=self.host,
+            prompt_count=len(runs),
+            load_duration=runs[0]['load_duration'],
+            time_to_first_token=sum(run['time_to_first_token'] for run in warm_runs) / len(warm_runs),
+            prompt_tokens_per_second=prompt_eval_count / prompt_eval_duration if prompt_eval_duration else 0.0,
+            generation_tokens_per_second=eval_count / eval_duration if eval_duration else 0.0,
+            peak_vram=sampler.peak_vram
+        )
+
+    def _run_prompt(self, model_name, prompt):
+        """Stream one generation, timing the first token and keeping the final statistics"""
+        started = time.perf_counter()
+        first_token = None
+        final = {}
+
+        response = requests.post(
+            f'{self.client.base_url}/api/generate',
+            headers=self.client._get_headers(),
+            json={'model': model_name, 'prompt': prompt, 'options': self.options, 'stream': True},
+            stream=True,
+            timeout=600
+        )
+        response.raise_for_status()
+
+        for line in response.iter_lines():
+            if not line:
+                continue
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if 'error' in data:
+                raise RequestException(data['error'])
+            if first_token is None and data.get('response'):
+                first_token = time.perf_counter() - started
+            if data.get('done'):
+                final = data
+                break
+
+        elapsed = time.perf_counter() - started
+        # Ollama reports durations in nanoseconds
+        return {
+            'time_to_first_token': first_token if first_token is not None else elapsed,
+            'load_duration': final.get('load_duration', 0) / 1e9,
+            'prompt_eval_count': final.get('prompt_eval_count', 0),
+            'prompt_eval_duration': final.get('prompt_eval_duration', 0) / 1e9,
+            'eval_count': final.get('eval_count', 0),
+            'eval_duration': final.get('eval_duration', 0) / 1e9,
+            'total_duration': final.get('total_duration', elapsed * 1e9) / 1e9
+        }
+
+    def _get_digests(self):
+        response = self.client._handle_request(requests.get, 'api/tags')
+        return {normalize_model_name(model['name']): model.get('digest', '') for model in response.get('models', [])}
+
+
+class _VramSampler:
+    """Poll /api/ps in the background and keep the highest size_vram seen for a model"""
+
+    def __init__(self, client, model_name):
+        self.client = client
+        self.model_name = model_name
+        self.peak_vram = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._poll, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        # Take a last sample, the model is still loaded right after the final prompt
+        self._sample()
+
+    def _poll(self):
+        while not self._stop.is_set():
+            self._sample()
+            self._stop.wait(VRAM_POLL_INTERVAL)
+
+    def _sample(self):
+        try:
+            response = requests.get(
+                f'{self.client.base_url}/api/ps',
+                headers=self.client._get_headers(),
+                timeout=5
+            )
+            models = response.json().get('models', []) if response.ok else []
+        except (RequestException, ValueError):
+            return
+        for model in models:
+            if model.get('name') == self.model_name or model.get('model') == self.model_name:
+                self.peak_vram = max(self.peak_vram, model.get('size_vram', 0))
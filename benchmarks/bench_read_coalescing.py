@@ -0,0 +1,98 @@
+"""Upstream /api/ps calls made by concurrent list_running() calls, with and without read coalescing.
+
+Starts a local stand-in for the Ollama server that answers after a fixed
+latency and counts the requests it receives, then fires bursts of
+simultaneous identical reads through OllamaClient.
+
+    python benchmarks/bench_read_coalescing.py
+"""
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import threading
+import json
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from coalescer import read_coalescer
+from ollama_client import OllamaClient
+
+UPSTREAM_LATENCY = 0.05
+CONCURRENCY_LEVELS = (1, 5, 10, 25, 50, 100)
+BURSTS = 5
+
+upstream_calls = 0
+upstream_lock = threading.Lock()
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        global upstream_calls
+        with upstream_lock:
+            upstream_calls += 1
+        time.sleep(UPSTREAM_LATENCY)
+        body = json.dumps({'models': [{'name': 'llama3:latest', 'size_vram': 1}]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def run_burst(base_url, concurrency):
+    barrier = threading.Barrier(concurrency)
+
+    def worker():
+        client = OllamaClient(base_url=base_url)
+        barrier.wait()
+        client.list_running()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def measure(base_url, concurrency, enabled):
+    global upstream_calls
+    read_coalescer.enabled = enabled
+    upstream_calls = 0
+    started = time.perf_counter()
+    for _ in range(BURSTS):
+        # Each burst starts cold so only coalescing, not the micro-cache, is measured
+        read_coalescer.invalidate(base_url)
+        run_burst(base_url, concurrency)
+    return upstream_calls / BURSTS, (time.perf_counter() - started) / BURSTS
+
+
+def main():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeOllamaHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_address[1]}'
+
+    # OllamaClient logs every instantiation, keep the output readable
+    real_stdout = sys.stdout
+    print(f"{'concurrency':>11} | {'upstream calls (off)':>20} | {'upstream calls (on)':>19} | {'burst time off/on':>18}")
+    for concurrency in CONCURRENCY_LEVELS:
+        sys.stdout = open(os.devnull, 'w')
+        try:
+            calls_off, time_off = measure(base_url, concurrency, enabled=False)
+            calls_on, time_on = measure(base_url, concurrency, enabled=True)
+        finally:
+            sys.stdout.close()
+            sys.stdout = real_stdout
+        print(f"{concurrency:>11} | {calls_off:>20.1f} | {calls_on:>19.1f} | {time_off * 1000:>7.0f}ms/{time_on * 1000:.0f}ms")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
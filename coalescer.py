@@ -0,0 +1,93 @@
+import threading
+import copy
+import time
+import os
+
+# Seconds a successful read stays cached per host and endpoint
+DEFAULT_TTL = float(os.environ.get('OLLAMA_READ_CACHE_TTL', 1.5))
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Share one upstream call between concurrent identical reads.
+
+    Callers asking for the same key while a call is in flight wait for it
+    instead of issuing their own, and successful results are kept for
+    `ttl` seconds. Every caller gets its own copy, so results can be
+    modified freely. Invalidating a host also stops calls already in
+    flight from caching what may now be stale data.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, enabled=True):
+        self.ttl = ttl
+        self.enabled = enabled
+        self._cache = {}
+        self._inflight = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.stats = {'calls': 0, 'coalesced': 0, 'cache_hits': 0}
+
+    def do(self, key, fn, cacheable=lambda result: True):
+        """Return fn() for key, sharing in-flight and recent results. key[0] must be the host."""
+        if not self.enabled:
+            return fn()
+
+        host = key[0]
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and cached[0] > time.monotonic():
+                self.stats['cache_hits'] += 1
+                return copy.deepcopy(cached[1])
+
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+                generation = self._generations.get(host, 0)
+                self.stats['calls'] += 1
+            else:
+                self.stats['coalesced'] += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+                if (call.error is None and self.ttl > 0 and cacheable(call.result)
+                        and self._generations.get(host, 0) == generation):
+                    self._cache[key] = (time.monotonic() + self.ttl, copy.deepcopy(call.result))
+            call.event.set()
+
+        return copy.deepcopy(call.result)
+
+    def invalidate(self, host, *endpoints):
+        """Forget cached reads of a host, for the given endpoints or all of them"""
+        with self._lock:
+            self._generations[host] = self._generations.get(host, 0) + 1
+            for key in list(self._cache):
+                if key[0] == host and (not endpoints or key[1] in endpoints):
+                    del self._cache[key]
+
+    def get_stats(self):
+        with self._lock:
+            return {**self.stats, 'ttl': self.ttl, 'enabled': self.enabled, 'cached': len(self._cache)}
+
+
+read_coalescer = SingleFlight()
@@ -0,0 +1,151 @@
+from models import EmbeddingVector, ModelUsage
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+import hashlib
+import struct
+import json
+import os
+
+DEFAULT_BATCH_SIZE = int(os.environ.get('OLLAMA_EMBED_BATCH_SIZE', 64))
+DEFAULT_CONCURRENCY = int(os.environ.get('OLLAMA_EMBED_CONCURRENCY', 4))
+# Dimension marking an error frame in float32 output, followed by the UTF-8 message
+ERROR_FRAME = 0xFFFFFFFF
+
+# Upper bound on the characters sent in one /api/embed call, so that a few
+# long documents do not end up in the same oversized request
+DEFAULT_MAX_CHARS = int(os.environ.get('OLLAMA_EMBED_MAX_CHARS', 32000))
+
+
+def pack_vector(vector):
+    return struct.pack(f'<{len(vector)}f', *vector)
+
+
+def unpack_vector(packed):
+    return list(struct.unpack(f'<{len(packed) // 4}f', packed))
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def iter_ndjson_texts(stream):
+    """Read texts from NDJSON lines holding either a JSON string or an object with a 'text' field"""
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        item = json.loads(line)
+        if isinstance(item, dict):
+            item = item.get('text', item.get('input'))
+        if not isinstance(item, str):
+            raise ValueError('Each NDJSON line must be a string or an object with a "text" field')
+        yield item
+
+
+class EmbeddingBatcher:
+    """Embed a large, possibly streamed, list of texts in input order.
+
+    Texts are split into sub-batches bounded by count and characters,
+    looked up in the vector cache by (model digest, text hash), and only
+    the misses are sent to /api/embed. At most `concurrency` sub-batches
+    are in flight, each holding a gateway slot, and results are yielded
+    in input order as soon as the preceding ones are ready.
+    """
+
+    def __init__(self, client, model_name, gateway=None, batch_size=None, concurrency=None,
+                 max_chars=None, truncate=True):
+        self.client = client
+        self.model_name = model_name
+        self.gateway = gateway
+        self.batch_size = batch_size or DEFAULT_BATCH_SIZE
+        self.concurrency = concurrency or DEFAULT_CONCURRENCY
+        self.max_chars = max_chars or DEFAULT_MAX_CHARS
+        self.truncate = truncate
+        self.digest = client.get_model_digest(model_name)
+
+    def _chunks(self, texts):
+        chunk = []
+        chars = 0
+        for index, text in enumerate(texts):
+            if chunk and (len(chunk) >= self.batch_size or chars + len(text) > self.max_chars):
+                yield chunk
+                chunk = []
+                chars = 0
+            chunk.append((index, text))
+            chars += len(text)
+        if chunk:
+            yield chunk
+
+    def iter_vectors(self, texts):
+        """Yield (index, packed float32 vector) in input order"""
+        pool = ThreadPoolExecutor(max_workers=self.concurrency)
+        pending = deque()
+        try:
+            for chunk in self._chunks(texts):
+                pending.append(pool.submit(self._embed_chunk, chunk))
+                # Keep a bounded window of sub-batches so memory stays flat on huge inputs
+                while len(pending) > self.concurrency or (pending and pending[0].done()):
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+            pool.shutdown(wait=False)
+
+    def _embed_chunk(self, chunk):
+        hashes = [text_hash(text) for _, text in chunk]
+        cached = EmbeddingVector.get_vectors(self.digest, set(hashes)) if self.digest else {}
+
+        misses = {}
+        for (_, text), h in zip(chunk, hashes):
+            if h not in cached:
+                misses.setdefault(h, text)
+
+        if misses:
+            if self.gateway:
+                with self.gateway.slot(self.model_name):
+                    vectors = self._embed(list(misses.values()))
+            else:
+                vectors = self._embed(list(misses.values()))
+            computed = {h: pack_vector(vector) for h, vector in zip(misses, vectors)}
+            if self.digest:
+                EmbeddingVector.store_vectors(self.digest, computed)
+            cached.update(computed)
+
+        return [(index, cached[h]) for (index, _), h in zip(chunk, hashes)]
+
+    def _embed(self, texts):
+        result = self.client.embed(self.model_name, texts, truncate=self.truncate)
+        if 'error' in result:
+            raise RuntimeError(result['error'])
+        vectors = result.get('embeddings', [])
+        if len(vectors) != len(texts):
+            raise RuntimeError(f'Expected {len(texts)} embeddings, got {len(vectors)}')
+        ModelUsage.log_usage(
+            self.model_name,
+            'embed',
+            result.get('prompt_eval_count'),
+            0,
+            result.get('total_duration', 0) / 1e9
+        )
+        return vectors
+
+    def iter_ndjson(self, texts):
+        try:
+            for index, packed in self.iter_vectors(texts):
+                yield json.dumps({'index': index, 'embedding': unpack_vector(packed)}, separators=(',', ':')) + '\n'
+        except Exception as e:
+            yield json.dumps({'error': str(e)}) + '\n'
+
+    def iter_float32(self, texts):
+        """Each vector as a little-endian uint32 dimension followed by that many float32 values.
+
+        A failure after the response has started ends the stream with an
+        ERROR_FRAME dimension followed by the error message in UTF-8.
+        """
+        try:
+            for _, packed in self.iter_vectors(texts):
+                yield struct.pack('<I', len(packed) // 4) + packed
+        except Exception as e:
+            yield struct.pack('<I', ERROR_FRAME) + str(e).encode('utf-8')
@@ -0,0 +1,215 @@
+from models import LatencySketch, normalize_model_name
+from collections import deque
+from contextlib import contextmanager
+import threading
+import time
+import os
+
+DEFAULT_CONFIG = {
+    'host_concurrency': int(os.environ.get('OLLAMA_GATEWAY_HOST_CONCURRENCY', 4)),
+    'model_concurrency': int(os.environ.get('OLLAMA_GATEWAY_MODEL_CONCURRENCY', 2)),
+    'model_limits': {},      # per-model overrides of model_concurrency
+    'max_queue': int(os.environ.get('OLLAMA_GATEWAY_MAX_QUEUE', 100)),
+    'max_bypass': 8,         # times a request may be overtaken by requests for a loaded model
+    'max_wait': 30,          # seconds after which a request is served in arrival order
+    'queue_timeout': int(os.environ.get('OLLAMA_GATEWAY_QUEUE_TIMEOUT', 300)),
+    'resident_ttl': 2        # seconds between two /api/ps refreshes
+}
+
+# Settings that hold a number of requests; the others are durations in seconds
+COUNT_SETTINGS = ('host_concurrency', 'model_concurrency', 'max_queue', 'max_bypass')
+# Counts below 1 would stop the gateway from admitting any request
+CONCURRENCY_SETTINGS = ('host_concurrency', 'model_concurrency')
+
+_gateways = {}
+_gateways_lock = threading.Lock()
+
+
+def get_gateway(client):
+    """Return the gateway for the client's server, creating it on first use"""
+    with _gateways_lock:
+        gateway = _gateways.get(client.base_url)
+        if gateway is None:
+            gateway = _gateways[client.base_url] = Gateway(client)
+        return gateway
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value >= 0
+
+
+def _is_count(value, minimum=0):
+    return isinstance(value, int) and not isinstance(value, bool) and value >= minimum
+
+
+class GatewayError(Exception):
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class _Ticket:
+    __slots__ = ('model', 'enqueued_at', 'bypassed', 'event')
+
+    def __init__(self, model):
+        self.model = model
+        self.enqueued_at = time.monotonic()
+        self.bypassed = 0
+        self.event = threading.Event()
+
+
+class _ModelState:
+    def __init__(self):
+        self.queue = deque()
+        self.active = 0
+        self.served = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.wait_sketch = LatencySketch()
+
+
+class Gateway:
+    """Admission control for inference requests sent to one Ollama server.
+
+    Requests wait in per-model FIFO queues and are admitted while the host
+    and model concurrency limits allow. Requests for a model that is
+    already loaded may overtake older requests that would force a swap,
+    but a request is never overtaken more than max_bypass times nor kept
+    waiting longer than max_wait seconds because of it.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.config = dict(DEFAULT_CONFIG)
+        self.active = 0
+        self.models = {}
+        self.resident = set()
+        self._resident_checked = 0
+        self._lock = threading.Lock()
+
+    def update_config(self, changes):
+        if not isinstance(changes, dict):
+            raise ValueError('Gateway settings must be a JSON object')
+        unknown = set(changes) - set(DEFAULT_CONFIG)
+        if unknown:
+            raise ValueError(f'Unknown gateway settings: {", ".join(sorted(unknown))}')
+        changes = dict(changes)
+        for key, value in changes.items():
+            if key == 'model_limits':
+                if not isinstance(value, dict) or not all(_is_count(limit, 1) for limit in value.values()):
+                    raise ValueError('model_limits must map model names to positive integers')
+                changes[key] = {normalize_model_name(name): limit for name, limit in value.items()}
+            elif key in CONCURRENCY_SETTINGS and not _is_count(value, 1):
+                raise ValueError(f'{key} must be a positive integer')
+            elif key in COUNT_SETTINGS and not _is_count(value):
+                raise ValueError(f'{key} must be a non-negative integer')
+            elif not _is_number(value):
+                raise ValueError(f'{key} must be a non-negative number')
+        with self._lock:
+            self.config = {**self.config, **changes}
+            self._dispatch()
+        return self.config
+
+    def _model_limit(self, model):
+        return self.config['model_limits'].get(model, self.config['model_concurrency'])
+
+    def _refresh_resident(self):
+        if time.monotonic() - self._resident_checked < self.config['resident_ttl']:
+            return
+        self._resident_checked = time.monotonic()
+        running = self.client.list_running()
+        if 'error' not in running:
+            resident = {normalize_model_name(model['name']) for model in running.get('models', [])}
+            with self._lock:
+                self.resident = resident | {name for name, state in self.models.items() if state.active}
+
+    def acquire(self, model):
+        """Wait for an admission slot for the model, raising GatewayError when rejected"""
+        model = normalize_model_name(model)
+        self._refresh_resident()
+        ticket = _Ticket(model)
+        with self._lock:
+            state = self.models.setdefault(model, _ModelState())
+            if sum(len(s.queue) for s in self.models.values()) >= self.config['max_queue']:
+                state.rejected += 1
+                raise GatewayError('Trop de requêtes en attente', 429)
+            state.queue.append(ticket)
+            self._dispatch()
+
+        if not ticket.event.wait(self.config['queue_timeout']):
+            with self._lock:
+                if not ticket.event.is_set():
+                    state.queue.remove(ticket)
+                    state.timed_out += 1
+                    raise GatewayError('Délai d\'attente de la file dépassé', 503)
+
+    def release(self, model):
+        model = normalize_model_name(model)
+        with self._lock:
+            self.active -= 1
+            self.models[model].active -= 1
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, model):
+        """Hold an admission slot for the model for the duration of the block"""
+        self.acquire(model)
+        try:
+            yield
+        finally:
+            self.release(model)
+
+    def _dispatch(self):
+        """Admit waiting requests while limits allow. Must be called with the lock held."""
+        while self.active < self.config['host_concurrency']:
+            heads = [
+                state.queue[0] for model, state in self.models.items()
+                if state.queue and state.active < self._model_limit(model)
+            ]
+            if not heads:
+                return
+
+            oldest = min(heads, key=lambda ticket: ticket.enqueued_at)
+            ticket = oldest
+            if oldest.model not in self.resident:
+                loaded = [head for head in heads if head.model in self.resident]
+                waited = time.monotonic() - oldest.enqueued_at
+                if loaded and oldest.bypassed < self.config['max_bypass'] and waited < self.config['max_wait']:
+                    ticket = min(loaded, key=lambda head: head.enqueued_at)
+                    for head in heads:
+                        if head.model not in self.resident and head.enqueued_at < ticket.enqueued_at:
+                            head.bypassed += 1
+
+            state = self.models[ticket.model]
+            state.queue.popleft()
+            state.active += 1
+            state.served += 1
+            state.wait_sketch.add(time.monotonic() - ticket.enqueued_at)
+            self.active += 1
+            # Admitting a request loads its model
+            self.resident.add(ticket.model)
+            ticket.event.set()
+
+    def get_stats(self):
+        with self._lock:
+            models = {}
+            for model, state in self.models.items():
+                models[model] = {
+                    'queue_depth': len(state.queue),
+                    'active': state.active,
+                    'limit': self._model_limit(model),
+                    'served': state.served,
+                    'rejected': state.rejected,
+                    'timed_out': state.timed_out,
+                    'oldest_wait': time.monotonic() - state.queue[0].enqueued_at if state.queue else 0.0,
+                    'p50_wait': state.wait_sketch.quantile(0.50),
+                    'p95_wait': state.wait_sketch.quantile(0.95),
+                    'p99_wait': state.wait_sketch.quantile(0.99)
+                }
+            return {
+                'config': self.config,
+                'active': self.active,
+                'queue_depth': sum(model['queue_depth'] for model in models.values()),
+                'resident': sorted(self.resident),
+                'models': models
+            }
@@ -0,0 +1,85 @@
+from collections import OrderedDict
+import threading
+import hashlib
+import json
+
+# Snapshots kept per server to answer ?since= requests; older versions get a full listing
+MAX_SNAPSHOTS = 32
+
+SORT_KEYS = {
+    'name': lambda model: model.get('name', ''),
+    'size': lambda model: model.get('size') or 0,
+    'modified_at': lambda model: model.get('modified_at') or '',
+    'family': lambda model: (model.get('details') or {}).get('family') or '',
+    'parameter_size': lambda model: (model.get('details') or {}).get('parameter_size') or ''
+}
+
+_inventories = {}
+_inventories_lock = threading.Lock()
+
+
+def get_inventory(host):
+    with _inventories_lock:
+        inventory = _inventories.get(host)
+        if inventory is None:
+            inventory = _inventories[host] = ModelInventory()
+        return inventory
+
+
+def _fingerprint(model):
+    return hashlib.sha256(json.dumps(model, sort_keys=True).encode()).hexdigest()
+
+
+class ModelInventory:
+    """Versioned snapshots of a server's model list.
+
+    A version is a hash of the list content, so it stays valid across
+    restarts and identical lists share it. Models are keyed by name, since
+    copies of a model share a digest; the digest and other metadata are
+    what make an entry "changed".
+    """
+
+    def __init__(self):
+        self._snapshots = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, models):
+        """Store the current list and return (version, {name: model})"""
+        entries = {model['name']: model for model in models}
+        fingerprints = {name: _fingerprint(model) for name, model in entries.items()}
+        version = hashlib.sha256(json.dumps(sorted(fingerprints.items())).encode()).hexdigest()[:16]
+        with self._lock:
+            self._snapshots[version] = fingerprints
+            self._snapshots.move_to_end(version)
+            while len(self._snapshots) > MAX_SNAPSHOTS:
+                self._snapshots.popitem(last=False)
+        return version, entries
+
+    def diff(self, since, version, entries):
+        """Changes from version `since` to the current entries, or None if `since` is unknown"""
+        with self._lock:
+            previous = self._snapshots.get(since)
+            current = self._snapshots.get(version)
+        if previous is None or current is None:
+            return None
+        return {
+            'added': [entries[name] for name in current if name not in previous],
+            'changed': [entries[name] for name in current if name in previous and previous[name] != current[name]],
+            'removed': [name for name in previous if name not in current]
+        }
+
+
+def filter_and_page(models, query=None, sort=None, order='asc', offset=0, limit=None):
+    """Server-side filtering on name/family, sorting and paging of a model list"""
+    if query:
+        query = query.lower()
+        models = [
+            model for model in models
+            if query in model.get('name', '').lower()
+            or query in ((model.get('details') or {}).get('family') or '').lower()
+        ]
+    if sort:
+        models = sorted(models, key=SORT_KEYS[sort], reverse=order == 'desc')
+    total = len(models)
+    end = offset + limit if limit is not None else None
+    return models[offset:end], total
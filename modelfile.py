@@ -0,0 +1,159 @@
+from collections import OrderedDict
+import threading
+
+# Parameters Ollama accepts several times, kept as lists
+MULTI_VALUE_PARAMETERS = ('stop',)
+
+# Parsed Modelfiles by (server, model digest); a digest never changes content
+CACHE_SIZE = 256
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+class Modelfile:
+    """Structured view of a Modelfile as returned by /api/show"""
+
+    def __init__(self, base='', parameters=None, template='', system='', adapters=None,
+                 licenses=None, messages=None, text=''):
+        self.text = text
+        self.base = base
+        self.parameters = parameters or {}
+        self.template = template
+        self.system = system
+        self.adapters = adapters or []
+        self.licenses = licenses or []
+        self.messages = messages or []
+
+    def to_dict(self):
+        return {
+            'from': self.base,
+            'parameters': self.parameters,
+            'template': self.template,
+            'system': self.system,
+            'adapters': self.adapters,
+            'license': self.licenses,
+            'messages': self.messages
+        }
+
+    def differs(self, system=None, template=None, parameters=None):
+        """Whether applying these settings on top of this Modelfile would change it.
+
+        Empty values mean "keep the current one", as in save_model_config.
+        Values are compared without surrounding whitespace, which the
+        interface trims and triple-quoted blocks often carry.
+        """
+        system = (system or '').strip()
+        if system and system != self.system.strip():
+            return True
+        template = (template or '').strip()
+        if template and template != self.template.strip():
+            return True
+        for key, value in (parameters or {}).items():
+            current = self.parameters.get(key)
+            if isinstance(current, list):
+                wanted = [str(v).strip() for v in value] if isinstance(value, list) else [str(value).strip()]
+                if wanted != [v.strip() for v in current]:
+                    return True
+            elif current is None or str(value).strip() != current.strip():
+                return True
+        return False
+
+
+def _read_value(lines, i, rest):
+    """Read an instruction argument starting at lines[i], returning (value, next line index)"""
+    if rest.startswith('"""'):
+        body = rest[3:]
+        end = body.find('"""')
+        if end != -1:
+            return body[:end], i + 1
+        parts = [body]
+        i += 1
+        while i < len(lines):
+            end = lines[i].find('"""')
+            if end != -1:
+                parts.append(lines[i][:end])
+                return '\n'.join(parts), i + 1
+            parts.append(lines[i])
+            i += 1
+        # Unterminated block: keep everything up to the end
+        return '\n'.join(parts), i
+    if len(rest) >= 2 and rest.startswith('"') and rest.endswith('"'):
+        return rest[1:-1], i + 1
+    return rest, i + 1
+
+
+def parse_modelfile(text):
+    """Parse a Modelfile in a single pass.
+
+    Instructions are case-insensitive, arguments may be bare, quoted or
+    wrapped in triple quotes spanning several lines, and comments and
+    blank lines are skipped.
+    """
+    modelfile = Modelfile(text=text or '')
+    lines = modelfile.text.split('\n')
+    i = 0
+    while i < len(lines):
+        line = lines[i].strip()
+        if not line or line.startswith('#'):
+            i += 1
+            continue
+
+        instruction, _, rest = line.partition(' ')
+        instruction = instruction.upper()
+        rest = rest.strip()
+        if instruction == 'PARAMETER':
+            key, _, raw = rest.partition(' ')
+            value, i = _read_value(lines, i, raw.strip())
+            if key in MULTI_VALUE_PARAMETERS:
+                modelfile.parameters.setdefault(key, []).append(value)
+            else:
+                modelfile.parameters[key] = value
+            continue
+        if instruction == 'MESSAGE':
+            role, _, raw = rest.partition(' ')
+            content, i = _read_value(lines, i, raw.strip())
+            modelfile.messages.append({'role': role, 'content': content})
+            continue
+
+        value, i = _read_value(lines, i, rest)
+        if instruction == 'FROM':
+            modelfile.base = value
+        elif instruction == 'TEMPLATE':
+            modelfile.template = value
+        elif instruction == 'SYSTEM':
+            modelfile.system = value
+        elif instruction == 'ADAPTER':
+            modelfile.adapters.append(value)
+        elif instruction == 'LICENSE':
+            modelfile.licenses.append(value)
+    return modelfile
+
+
+def build_modelfile(model_name, system=None, template=None, parameters=None):
+    """Modelfile deriving a new version of model_name with the given overrides"""
+    modelfile = f"FROM {model_name}\n"
+    if parameters:
+        for key, value in parameters.items():
+            for item in value if isinstance(value, list) else [value]:
+                modelfile += f'PARAMETER {key} {item}\n'
+    if system:
+        modelfile += f'SYSTEM """{system}"""\n'
+    if template:
+        modelfile += f'TEMPLATE """{template}"""\n'
+    return modelfile
+
+
+def get_cached_modelfile(host, digest):
+    with _cache_lock:
+        modelfile = _cache.get((host, digest))
+        if modelfile is not None:
+            _cache.move_to_end((host, digest))
+        return modelfile
+
+
+def cache_modelfile(host, digest, modelfile):
+    with _cache_lock:
+        _cache[(host, digest)] = modelfile
+        _cache.move_to_end((host, digest))
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
@@ -1,15 +1,310 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Float
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Float, Text, LargeBinary, UniqueConstraint, Index, func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from datetime import datetime
+from datetime import datetime, timedelta
+import math
+import json
+import os
+import time
 
 Base = declarative_base()
-engine = create_engine('sqlite:///ollama_stats.db')
+engine = create_engine(os.environ.get('OLLAMA_STATS_DATABASE_URL', 'sqlite:///ollama_stats.db'))
 Session = sessionmaker(bind=engine)
 
+# Rollup granularities, from finest to coarsest
+BUCKETS = ('minute', 'hour', 'day')
+
+# Raw rows older than this are pruned; rollups keep the aggregated history
+RAW_RETENTION_DAYS = int(os.environ.get('OLLAMA_USAGE_RETENTION_DAYS', 30))
+
+# How long each rollup granularity is kept (None = forever)
+ROLLUP_RETENTION = {
+    'minute': timedelta(days=2),
+    'hour': timedelta(days=90),
+    'day': None
+}
+
+# Raw usage columns, in export order
+EXPORT_COLUMNS = ('id', 'model_name', 'operation', 'prompt_tokens', 'completion_tokens', 'total_duration', 'timestamp')
+
+# Operations the manager runs itself, which say nothing about user demand
+INTERNAL_OPERATIONS = ('benchmark', 'preload')
+
+# Minimum delay between two automatic compactions triggered by log_usage
+COMPACTION_INTERVAL = 3600
+_last_compaction = 0
+
+
+def normalize_model_name(model_name):
+    """Full name:tag form of a model name, as reported by /api/tags and /api/ps"""
+    if model_name and ':' not in model_name.rsplit('/', 1)[-1]:
+        return f'{model_name}:latest'
+    return model_name
+
+
+def model_name_variants(model_names):
+    """Names to match when reading rows of these models: the name:tag form, plus the
+    untagged form of ":latest" names that rows written before normalization may hold"""
+    variants = set()
+    for model_name in model_names:
+        model_name = normalize_model_name(model_name)
+        variants.add(model_name)
+        if model_name.endswith(':latest'):
+            variants.add(model_name[:-len(':latest')])
+    return sorted(variants)
+
+
+def truncate_timestamp(timestamp, bucket):
+    """Return the start of the bucket containing the given timestamp"""
+    if bucket == 'minute':
+        return timestamp.replace(second=0, microsecond=0)
+    if bucket == 'hour':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    if bucket == 'day':
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f'Invalid bucket: {bucket}')
+
+
+def covering_bucket(bucket, start, now=None):
+    """Finest bucket, no finer than the requested one, whose rollups are still kept back to start"""
+    now = now or datetime.utcnow()
+    for candidate in BUCKETS[BUCKETS.index(bucket):]:
+        retention = ROLLUP_RETENTION[candidate]
+        if retention is None or (start is not None and start >= now - retention):
+            return candidate
+    return BUCKETS[-1]
+
+
+class LatencySketch:
+    """Mergeable latency sketch with bounded relative error.
+
+    Values are counted in logarithmic bins so that any percentile is
+    returned within `relative_accuracy` of the true value, and two
+    sketches can be merged by adding their bin counts.
+    """
+
+    def __init__(self, relative_accuracy=0.01, bins=None, zero_count=0):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins = dict(bins or {})
+        self.zero_count = zero_count
+
+    @property
+    def count(self):
+        return self.zero_count + sum(self.bins.values())
+
+    def add(self, value, count=1):
+        if value is None:
+            return
+        if value <= 0:
+            self.zero_count += count
+            return
+        index = int(math.ceil(math.log(value) / self._log_gamma))
+        self.bins[index] = self.bins.get(index, 0) + count
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError('Cannot merge sketches with different accuracies')
+        self.zero_count += other.zero_count
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        return self
+
+    def quantile(self, q):
+        total = self.count
+        if not total:
+            return None
+        rank = q * (total - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if rank < seen:
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+    def to_json(self):
+        return json.dumps({
+            'a': self.relative_accuracy,
+            'z': self.zero_count,
+            'b': {str(k): v for k, v in self.bins.items()}
+        })
+
+    @classmethod
+    def from_json(cls, data):
+        if not data:
+            return cls()
+        raw = json.loads(data)
+        return cls(
+            relative_accuracy=raw.get('a', 0.01),
+            bins={int(k): v for k, v in raw.get('b', {}).items()},
+            zero_count=raw.get('z', 0)
+        )
+
+
+class ModelUsageRollup(Base):
+    __tablename__ = 'model_usage_rollup'
+    __table_args__ = (
+        UniqueConstraint('bucket', 'bucket_start', 'model_name', 'operation', name='uq_rollup_key'),
+        Index('ix_rollup_lookup', 'bucket', 'model_name', 'bucket_start'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    bucket = Column(String, nullable=False)  # 'minute', 'hour' or 'day'
+    bucket_start = Column(DateTime, nullable=False)
+    model_name = Column(String, nullable=False)
+    operation = Column(String, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    total_duration = Column(Float, nullable=False, default=0.0)  # in seconds
+    latency_sketch = Column(Text)  # serialized LatencySketch of total_duration
+
+    @classmethod
+    def record(cls, session, model_name, operation, prompt_tokens, completion_tokens, total_duration, timestamp):
+        """Add one usage row to the minute, hour and day rollups"""
+        for bucket in BUCKETS:
+            bucket_start = truncate_timestamp(timestamp, bucket)
+            rollup = session.query(cls).filter_by(
+                bucket=bucket,
+                bucket_start=bucket_start,
+                model_name=model_name,
+                operation=operation
+            ).first()
+            if rollup is None:
+                rollup = cls(
+                    bucket=bucket,
+                    bucket_start=bucket_start,
+                    model_name=model_name,
+                    operation=operation,
+                    count=0,
+                    prompt_tokens=0,
+                    completion_tokens=0,
+                    total_duration=0.0
+                )
+                session.add(rollup)
+
+            rollup.count += 1
+            rollup.prompt_tokens += prompt_tokens or 0
+            rollup.completion_tokens += completion_tokens or 0
+            rollup.total_duration += total_duration or 0.0
+
+            sketch = LatencySketch.from_json(rollup.latency_sketch)
+            sketch.add(total_duration)
+            rollup.latency_sketch = sketch.to_json()
+
+    @classmethod
+    def query_stats(cls, model_name=None, start=None, end=None, bucket='hour'):
+        """Aggregate rollups over [start, end) and return totals plus a time series.
+
+        Ranges reaching further back than the retention of the requested
+        bucket are served from the next coarser bucket that still covers
+        them; "bucket" reports the one used, "requested_bucket" the one asked for.
+        """
+        if bucket not in BUCKETS:
+            raise ValueError(f'Invalid bucket: {bucket}')
+        requested_bucket = bucket
+        bucket = covering_bucket(bucket, start)
+
+        session = Session()
+        try:
+            query = session.query(cls).filter(cls.bucket == bucket)
+            if model_name:
+                query = query.filter(cls.model_name.in_(model_name_variants([model_name])))
+            if start:
+                query = query.filter(cls.bucket_start >= truncate_timestamp(start, bucket))
+            if end:
+                query = query.filter(cls.bucket_start < end)
+
+            series = {}
+            total_sketch = LatencySketch()
+            stats = {
+                'bucket': bucket,
+                'requested_bucket': requested_bucket,
+                'from': start.isoformat() if start else None,
+                'to': end.isoformat() if end else None,
+                'total_operations': 0,
+                'total_prompt_tokens': 0,
+                'total_completion_tokens': 0,
+                'total_duration': 0.0,
+                'operations_by_type': {}
+            }
+
+            for rollup in query.order_by(cls.bucket_start):
+                sketch = LatencySketch.from_json(rollup.latency_sketch)
+                total_sketch.merge(sketch)
+
+                stats['total_operations'] += rollup.count
+                stats['total_prompt_tokens'] += rollup.prompt_tokens
+                stats['total_completion_tokens'] += rollup.completion_tokens
+                stats['total_duration'] += rollup.total_duration
+                stats['operations_by_type'][rollup.operation] = \
+                    stats['operations_by_type'].get(rollup.operation, 0) + rollup.count
+
+                point = series.get(rollup.bucket_start)
+                if point is None:
+                    point = series[rollup.bucket_start] = {
+                        'count': 0,
+                        'prompt_tokens': 0,
+                        'completion_tokens': 0,
+                        'total_duration': 0.0,
+                        'sketch': LatencySketch()
+                    }
+                point['count'] += rollup.count
+                point['prompt_tokens'] += rollup.prompt_tokens
+                point['completion_tokens'] += rollup.completion_tokens
+                point['total_duration'] += rollup.total_duration
+                point['sketch'].merge(sketch)
+
+            stats.update(_latency_summary(
+                total_sketch, stats['total_completion_tokens'], stats['total_duration']))
+            stats['series'] = []
+            for bucket_start, point in series.items():
+                sketch = point.pop('sketch')
+                point['bucket_start'] = bucket_start.isoformat()
+                point.update(_latency_summary(sketch, point['completion_tokens'], point['total_duration']))
+                stats['series'].append(point)
+
+            return stats
+        finally:
+            session.close()
+
+    @classmethod
+    def get_activity(cls, start, bucket='hour'):
+        """User operation counts per model and bucket since start, as {model_name: [(bucket_start, count)]}"""
+        session = Session()
+        try:
+            rows = session.query(
+                cls.model_name, cls.bucket_start, func.sum(cls.count)
+            ).filter(
+                cls.bucket == bucket,
+                cls.bucket_start >= truncate_timestamp(start, bucket),
+                cls.operation.notin_(INTERNAL_OPERATIONS)
+            ).group_by(cls.model_name, cls.bucket_start)
+
+            activity = {}
+            for model_name, bucket_start, count in rows:
+                activity.setdefault(model_name, []).append((bucket_start, count))
+            return activity
+        finally:
+            session.close()
+
+
+def _latency_summary(sketch, completion_tokens, total_duration):
+    return {
+        'tokens_per_second': completion_tokens / total_duration if total_duration else 0.0,
+        'p50_duration': sketch.quantile(0.50),
+        'p95_duration': sketch.quantile(0.95),
+        'p99_duration': sketch.quantile(0.99)
+    }
+
+
 class ModelUsage(Base):
     __tablename__ = 'model_usage'
-    
+
     id = Column(Integer, primary_key=True)
     model_name = Column(String, nullable=False)
     operation = Column(String, nullable=False)  # 'generate', 'chat', etc.
@@ -20,45 +315,335 @@ class ModelUsage(Base):
 
     @classmethod
     def log_usage(cls, model_name, operation, prompt_tokens, completion_tokens, total_duration):
+        model_name = normalize_model_name(model_name)
+        for attempt in range(2):
+            session = Session()
+            try:
+                usage = cls(
+                    model_name=model_name,
+                    operation=operation,
+                    prompt_tokens=prompt_tokens,
+                    completion_tokens=completion_tokens,
+                    total_duration=total_duration,
+                    timestamp=datetime.utcnow()
+                )
+                session.add(usage)
+                ModelUsageRollup.record(
+                    session, model_name, operation, prompt_tokens,
+                    completion_tokens, total_duration, usage.timestamp)
+                session.commit()
+                break
+            except IntegrityError:
+                # Another writer created the same rollup row first, retry as an update
+                session.rollback()
+                if attempt:
+                    raise
+            finally:
+                session.close()
+
+        cls.maybe_compact()
+
+    @classmethod
+    def get_model_stats(cls, model_name=None, start=None, end=None, bucket=None):
+        """All-time stats come from the day rollups, ranged stats from the requested bucket"""
+        if start or end or bucket:
+            return ModelUsageRollup.query_stats(model_name, start, end, bucket or 'hour')
+
+        stats = ModelUsageRollup.query_stats(model_name, bucket='day')
+        return {
+            key: stats[key] for key in (
+                'total_operations',
+                'total_prompt_tokens',
+                'total_completion_tokens',
+                'total_duration',
+                'operations_by_type',
+                'tokens_per_second',
+                'p50_duration',
+                'p95_duration',
+                'p99_duration'
+            )
+        }
+
+    @classmethod
+    def compact(cls, now=None):
+        """Prune raw rows and fine-grained rollups past their retention age"""
+        now = now or datetime.utcnow()
         session = Session()
         try:
-            usage = cls(
-                model_name=model_name,
-                operation=operation,
-                prompt_tokens=prompt_tokens,
-                completion_tokens=completion_tokens,
-                total_duration=total_duration
-            )
-            session.add(usage)
+            removed = {
+                'raw': session.query(cls).filter(
+                    cls.timestamp < now - timedelta(days=RAW_RETENTION_DAYS)
+                ).delete(synchronize_session=False)
+            }
+            for bucket, retention in ROLLUP_RETENTION.items():
+                if retention is None:
+                    continue
+                removed[bucket] = session.query(ModelUsageRollup).filter(
+                    ModelUsageRollup.bucket == bucket,
+                    ModelUsageRollup.bucket_start < now - retention
+                ).delete(synchronize_session=False)
+            session.commit()
+            return removed
+        finally:
+            session.close()
+
+    @classmethod
+    def maybe_compact(cls):
+        global _last_compaction
+        current_time = time.time()
+        if current_time - _last_compaction < COMPACTION_INTERVAL:
+            return
+        _last_compaction = current_time
+        try:
+            cls.compact()
+        except Exception as e:
+            print(f"Usage compaction failed: {str(e)}")
+
+    @classmethod
+    def _export_query(cls, session, columns, model_names=None, start=None, end=None, after_id=None, since=None):
+        query = session.query(*columns)
+        if model_names:
+            query = query.filter(cls.model_name.in_(model_name_variants(model_names)))
+        if start:
+            query = query.filter(cls.timestamp >= start)
+        if end:
+            query = query.filter(cls.timestamp < end)
+        if after_id:
+            query = query.filter(cls.id > after_id)
+        if since:
+            query = query.filter(cls.timestamp > since)
+        return query
+
+    @classmethod
+    def export_watermark(cls, **filters):
+        """Id and timestamp of the last row an export with these filters would include, or (None, None)"""
+        session = Session()
+        try:
+            last_id = cls._export_query(session, [func.max(cls.id)], **filters).scalar()
+            if last_id is None:
+                return None, None
+            return last_id, session.query(cls.timestamp).filter(cls.id == last_id).scalar()
+        finally:
+            session.close()
+
+    @classmethod
+    def iter_export_batches(cls, until_id, batch_size=1000, after_id=None, **filters):
+        """Yield raw rows as lists of EXPORT_COLUMNS tuples, in id order, up to until_id.
+
+        Each batch is a separate keyset query (id > last id seen), so no
+        read transaction is held while the caller streams the batch out
+        and concurrent log_usage writes are never blocked.
+        """
+        columns = [getattr(cls, name) for name in EXPORT_COLUMNS]
+        last_id = after_id or 0
+        while last_id < until_id:
+            session = Session()
+            try:
+                batch = cls._export_query(session, columns, after_id=last_id, **filters).filter(
+                    cls.id <= until_id
+                ).order_by(cls.id).limit(batch_size).all()
+            finally:
+                session.close()
+            if not batch:
+                return
+            last_id = batch[-1][0]
+            yield [tuple(row) for row in batch]
+
+    @classmethod
+    def backfill_rollups(cls):
+        """Build rollups from existing raw rows when the rollup table is empty"""
+        session = Session()
+        try:
+            if session.query(func.count(ModelUsageRollup.id)).scalar():
+                return
+
+            rollups = {}
+            last_id = 0
+            while True:
+                batch = session.query(cls).filter(cls.id > last_id).order_by(cls.id).limit(1000).all()
+                if not batch:
+                    break
+                last_id = batch[-1].id
+                for usage in batch:
+                    timestamp = usage.timestamp or datetime.utcnow()
+                    for bucket in BUCKETS:
+                        key = (bucket, truncate_timestamp(timestamp, bucket), usage.model_name, usage.operation)
+                        rollup = rollups.get(key)
+                        if rollup is None:
+                            rollup = rollups[key] = {
+                                'count': 0,
+                                'prompt_tokens': 0,
+                                'completion_tokens': 0,
+                                'total_duration': 0.0,
+                                'sketch': LatencySketch()
+                            }
+                        rollup['count'] += 1
+                        rollup['prompt_tokens'] += usage.prompt_tokens or 0
+                        rollup['completion_tokens'] += usage.completion_tokens or 0
+                        rollup['total_duration'] += usage.total_duration or 0.0
+                        rollup['sketch'].add(usage.total_duration)
+
+            for (bucket, bucket_start, model_name, operation), rollup in rollups.items():
+                session.add(ModelUsageRollup(
+                    bucket=bucket,
+                    bucket_start=bucket_start,
+                    model_name=model_name,
+                    operation=operation,
+                    count=rollup['count'],
+                    prompt_tokens=rollup['prompt_tokens'],
+                    completion_tokens=rollup['completion_tokens'],
+                    total_duration=rollup['total_duration'],
+                    latency_sketch=rollup['sketch'].to_json()
+                ))
             session.commit()
         finally:
             session.close()
 
+class BenchmarkResult(Base):
+    __tablename__ = 'benchmark_result'
+    __table_args__ = (
+        Index('ix_benchmark_lookup', 'model_name', 'host', 'timestamp'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    model_name = Column(String, nullable=False)
+    model_digest = Column(String, nullable=False, default='')
+    host = Column(String, nullable=False)
+    prompt_count = Column(Integer, nullable=False)
+    load_duration = Column(Float)  # in seconds, measured on the first prompt
+    time_to_first_token = Column(Float)  # in seconds
+    prompt_tokens_per_second = Column(Float)
+    generation_tokens_per_second = Column(Float)
+    peak_vram = Column(Integer)  # in bytes, from /api/ps
+    timestamp = Column(DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'model_name': self.model_name,
+            'model_digest': self.model_digest,
+            'host': self.host,
+            'prompt_count': self.prompt_count,
+            'load_duration': self.load_duration,
+            'time_to_first_token': self.time_to_first_token,
+            'prompt_tokens_per_second': self.prompt_tokens_per_second,
+            'generation_tokens_per_second': self.generation_tokens_per_second,
+            'peak_vram': self.peak_vram,
+            'timestamp': self.timestamp.isoformat() if self.timestamp else None
+        }
+
     @classmethod
-    def get_model_stats(cls, model_name=None):
+    def save_result(cls, **values):
+        session = Session()
+        try:
+            result = cls(**values)
+            session.add(result)
+            session.commit()
+            return result.to_dict()
+        finally:
+            session.close()
+
+    @classmethod
+    def get_results(cls, model_names=None, host=None):
+        """Latest result per model digest and host, fastest generation first"""
         session = Session()
         try:
             query = session.query(cls)
-            if model_name:
-                query = query.filter(cls.model_name == model_name)
-            
-            results = query.all()
-            stats = {
-                'total_operations': len(results),
-                'total_prompt_tokens': sum(r.prompt_tokens for r in results if r.prompt_tokens),
-                'total_completion_tokens': sum(r.completion_tokens for r in results if r.completion_tokens),
-                'total_duration': sum(r.total_duration for r in results if r.total_duration),
-                'operations_by_type': {}
-            }
-            
-            for r in results:
-                if r.operation not in stats['operations_by_type']:
-                    stats['operations_by_type'][r.operation] = 0
-                stats['operations_by_type'][r.operation] += 1
-            
-            return stats
+            if model_names:
+                query = query.filter(cls.model_name.in_(model_name_variants(model_names)))
+            if host:
+                query = query.filter(cls.host == host)
+
+            latest = {}
+            for result in query.order_by(cls.timestamp):
+                latest[(result.model_name, result.model_digest, result.host)] = result
+
+            return sorted(
+                (result.to_dict() for result in latest.values()),
+                key=lambda result: result['generation_tokens_per_second'] or 0,
+                reverse=True
+            )
+        finally:
+            session.close()
+
+class EmbeddingVector(Base):
+    __tablename__ = 'embedding_vector'
+    __table_args__ = (
+        UniqueConstraint('model_digest', 'text_hash', name='uq_embedding_key'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    model_digest = Column(String, nullable=False)
+    text_hash = Column(String, nullable=False)  # sha256 of the UTF-8 text
+    vector = Column(LargeBinary, nullable=False)  # little-endian float32
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Bound parameters per IN query, below SQLite's limit
+    LOOKUP_BATCH = 500
+
+    @classmethod
+    def get_vectors(cls, model_digest, text_hashes):
+        """Return {text_hash: packed vector} for the hashes already cached"""
+        session = Session()
+        try:
+            found = {}
+            text_hashes = list(text_hashes)
+            for i in range(0, len(text_hashes), cls.LOOKUP_BATCH):
+                rows = session.query(cls.text_hash, cls.vector).filter(
+                    cls.model_digest == model_digest,
+                    cls.text_hash.in_(text_hashes[i:i + cls.LOOKUP_BATCH])
+                )
+                found.update(rows)
+            return found
+        finally:
+            session.close()
+
+    @classmethod
+    def store_vectors(cls, model_digest, vectors):
+        """Store {text_hash: packed vector}, ignoring hashes cached concurrently"""
+        session = Session()
+        try:
+            existing = cls.get_vectors(model_digest, vectors.keys())
+            session.add_all(
+                cls(model_digest=model_digest, text_hash=text_hash, vector=vector)
+                for text_hash, vector in vectors.items() if text_hash not in existing
+            )
+            session.commit()
+        except IntegrityError:
+            session.rollback()
+        finally:
+            session.close()
+
+
+class SchedulerPolicy(Base):
+    __tablename__ = 'scheduler_policy'
+
+    id = Column(Integer, primary_key=True)
+    host = Column(String, nullable=False, unique=True)
+    policy = Column(Text, nullable=False)  # JSON document, see scheduler.DEFAULT_POLICY
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @classmethod
+    def get_policy(cls, host):
+        session = Session()
+        try:
+            row = session.query(cls).filter_by(host=host).first()
+            return json.loads(row.policy) if row else None
+        finally:
+            session.close()
+
+    @classmethod
+    def save_policy(cls, host, policy):
+        session = Session()
+        try:
+            row = session.query(cls).filter_by(host=host).first()
+            if row is None:
+                row = cls(host=host)
+                session.add(row)
+            row.policy = json.dumps(policy)
+            session.commit()
         finally:
             session.close()
 
 # Create tables
 Base.metadata.create_all(engine)
+ModelUsage.backfill_rollups()
@@ -1,10 +1,19 @@
 import requests
 from requests.exceptions import ConnectionError, RequestException, Timeout
-from models import ModelUsage
+from models import ModelUsage, BenchmarkResult, normalize_model_name
+from benchmark import BenchmarkRunner
+from response_cache import get_response_cache
+from modelfile import parse_modelfile, build_modelfile, get_cached_modelfile, cache_modelfile
+from coalescer import read_coalescer
+from concurrent.futures import ThreadPoolExecutor
+import queue
 import time
 import os
 import json
 
+# Read-only endpoints whose concurrent identical calls share one upstream request
+READ_ENDPOINTS = {('get', 'api/tags'), ('get', 'api/ps'), ('post', 'api/show')}
+
 class OllamaClient:
     def __init__(self, base_url=None):
         self.base_url = base_url or os.environ.get('OLLAMA_SERVER_URL', 'http://localhost:11434')
@@ -29,6 +38,20 @@ class OllamaClient:
         if endpoint.startswith('/'):
             endpoint = endpoint[1:]
 
+        if (method.__name__, endpoint) in READ_ENDPOINTS:
+            key = (self.base_url, endpoint, json.dumps(kwargs.get('json'), sort_keys=True))
+            return read_coalescer.do(
+                key,
+                lambda: self._send_request(method, endpoint, **kwargs),
+                cacheable=lambda result: 'error' not in result
+            )
+        return self._send_request(method, endpoint, **kwargs)
+
+    def _invalidate_reads(self, *endpoints):
+        """Drop micro-cached reads after a call that changed the server state"""
+        read_coalescer.invalidate(self.base_url, *endpoints)
+
+    def _send_request(self, method, endpoint, **kwargs):
         url = f'{self.base_url}/{endpoint}'
         retries = 0
         last_error = None
@@ -63,25 +86,22 @@ class OllamaClient:
 
         return {'error': last_error}
 
-    def save_model_config(self, model_name, system=None, template=None, parameters=None):
-        """Save model configuration by creating a new custom model"""
-        try:
-            # Build Modelfile content
-            modelfile = f"FROM {model_name}\n"
-
-            # Add parameters if provided
-            if parameters:
-                for key, value in parameters.items():
-                    modelfile += f'PARAMETER {key} {value}\n'
-
-            # Add system prompt if provided
-            if system:
-                modelfile += f'SYSTEM """{system}"""\n'
-
-            # Add template if provided    
-            if template:
-                modelfile += f'TEMPLATE """{template}"""\n'
+    def save_model_config(self, model_name, system=None, template=None, parameters=None, on_status=None):
+        """Save model configuration by creating a new custom model.
 
+        The model is left untouched when the settings already match its
+        current Modelfile.
+        """
+        try:
+            current = self.get_modelfile(model_name)
+            if 'error' not in current and not current['modelfile'].differs(system, template, parameters):
+                return {
+                    'success': True,
+                    'skipped': True,
+                    'message': f'Configuration du modèle {model_name} inchangée'
+                }
+
+            modelfile = build_modelfile(model_name, system, template, parameters)
             print(f"Creating model with Modelfile:\n{modelfile}")  # Debug log
 
             # Create new model using Ollama API with streaming response handling
@@ -110,14 +130,18 @@ class OllamaClient:
                             break
                         if 'status' in data:
                             status = data['status']
+                            if on_status:
+                                on_status(status)
                             if status == 'success':
                                 break
                     except json.JSONDecodeError:
                         continue
 
+            self._invalidate_reads()
             if error:
                 return {'success': False, 'error': error}
 
+            get_response_cache().invalidate_model(self.base_url, model_name)
             return {'success': True, 'message': f'Configuration du modèle {model_name} mise à jour avec succès'}
 
         except requests.exceptions.RequestException as e:
@@ -125,6 +149,38 @@ class OllamaClient:
         except Exception as e:
             return {'success': False, 'error': str(e)}
 
+    def apply_config_bulk(self, model_names, system=None, template=None, parameters=None, concurrency=4):
+        """Save the same configuration on several models concurrently, yielding progress events"""
+        events = queue.Queue()
+
+        def apply(model_name):
+            events.put({'model': model_name, 'status': 'started'})
+            result = self.save_model_config(
+                model_name,
+                system=system,
+                template=template,
+                parameters=parameters,
+                on_status=lambda status: events.put({'model': model_name, 'status': status})
+            )
+            if result.get('skipped'):
+                events.put({'model': model_name, 'status': 'skipped', 'done': True, 'success': True,
+                            'message': result['message']})
+            else:
+                events.put({'model': model_name, 'status': 'done', 'done': True, **result})
+
+        pool = ThreadPoolExecutor(max_workers=max(1, concurrency))
+        try:
+            for model_name in model_names:
+                pool.submit(apply, model_name)
+            remaining = len(model_names)
+            while remaining:
+                event = events.get()
+                if event.get('done'):
+                    remaining -= 1
+                yield event
+        finally:
+            pool.shutdown(wait=False)
+
     def check_server(self):
         """Check if Ollama server is running with caching"""
         current_time = time.time()
@@ -136,12 +192,14 @@ class OllamaClient:
                 self._server_status = False
                 return False
 
-            response = requests.get(
-                f'{self.base_url}/api/tags',
-                headers=self._get_headers(),
-                timeout=5
+            self._server_status = read_coalescer.do(
+                (self.base_url, 'status', None),
+                lambda: requests.get(
+                    f'{self.base_url}/api/tags',
+                    headers=self._get_headers(),
+                    timeout=5
+                ).status_code == 200
             )
-            self._server_status = response.status_code == 200
         except Exception as e:
             print(f"Server check failed with error: {str(e)}")
             self._server_status = False
@@ -194,6 +252,7 @@ class OllamaClient:
 
             # Verify the model was stopped
             time.sleep(1)  # Give server time to process
+            self._invalidate_reads('api/ps')
             running_models = self.list_running()
             if 'error' in running_models:
                 return {'success': False, 'error': running_models['error']}
@@ -206,6 +265,69 @@ class OllamaClient:
         except Exception as e:
             return {'success': False, 'error': str(e)}
 
+    def forward(self, endpoint, payload):
+        """Send an inference request to Ollama and return a generator of the raw response lines.
+
+        The request is sent before returning so that connection and HTTP
+        errors surface to the caller; the final object's timings are
+        logged as model usage once the response has been relayed.
+        """
+        response = requests.post(
+            f'{self.base_url}/{endpoint}',
+            headers=self._get_headers(),
+            json=payload,
+            stream=True,
+            timeout=600
+        )
+        response.raise_for_status()
+        return self._relay(response, endpoint.rsplit('/', 1)[-1], payload.get('model'))
+
+    def _relay(self, response, operation, model_name):
+        final = None
+        try:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                yield line + b'\n'
+                try:
+                    data = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if data.get('done') or 'embeddings' in data or 'embedding' in data:
+                    final = data
+        finally:
+            response.close()
+
+        if final is not None:
+            ModelUsage.log_usage(
+                model_name,
+                operation,
+                final.get('prompt_eval_count'),
+                final.get('eval_count'),
+                final.get('total_duration', 0) / 1e9
+            )
+
+    def embed(self, model_name, texts, truncate=True):
+        """Embed a list of texts in a single /api/embed call"""
+        return self._handle_request(
+            requests.post,
+            'api/embed',
+            json={'model': model_name, 'input': texts, 'truncate': truncate},
+            timeout=600
+        )
+
+    def set_keep_alive(self, model_name, keep_alive):
+        """Load a model with an empty prompt, keeping it resident for keep_alive ('0s' unloads it)"""
+        response = self._handle_request(
+            requests.post,
+            'api/generate',
+            json={'model': model_name, 'prompt': '', 'keep_alive': keep_alive}
+        )
+        self._invalidate_reads('api/ps')
+        if 'error' in response:
+            return {'success': False, 'error': response['error']}
+        return {'success': True}
+
     def delete_model(self, model_name):
         """Delete a model"""
         response = self._handle_request(
@@ -213,62 +335,77 @@ class OllamaClient:
             'api/delete',
             json={'name': model_name}
         )
+        self._invalidate_reads()
         if 'error' in response:
             return {'success': False, 'error': response['error']}
+        get_response_cache().invalidate_model(self.base_url, model_name)
         return {'success': True, 'message': f'Le modèle {model_name} a été supprimé avec succès'}
 
-    def get_model_stats(self, model_name=None):
-        """Get usage statistics for a specific model or all models"""
-        return ModelUsage.get_model_stats(model_name)
+    def get_model_stats(self, model_name=None, start=None, end=None, bucket=None):
+        """Get usage statistics for a specific model or all models, optionally over a time range"""
+        return ModelUsage.get_model_stats(model_name, start=start, end=end, bucket=bucket)
+
+    def run_benchmark(self, model_names, prompts=None, options=None, cold_start=True):
+        """Benchmark models on this server and store the results"""
+        runner = BenchmarkRunner(self, prompts=prompts, options=options, cold_start=cold_start)
+        return runner.run(model_names)
+
+    def get_benchmark_results(self, model_names=None):
+        """Get stored benchmark results for this server, fastest first"""
+        runner = BenchmarkRunner(self)
+        return BenchmarkResult.get_results(model_names, host=runner.host)
+
+    def compact_usage(self):
+        """Prune usage history past its retention age"""
+        return ModelUsage.compact()
+
+    def get_modelfile(self, model_name):
+        """Get the parsed Modelfile of a model, cached by model digest"""
+        digest = self.get_model_digest(model_name)
+        if digest:
+            cached = get_cached_modelfile(self.base_url, digest)
+            if cached is not None:
+                return {'modelfile': cached}
+
+        response = self._handle_request(
+            requests.post,
+            'api/show',
+            json={'name': model_name}
+        )
+        if 'error' in response:
+            return {'error': response['error']}
+
+        modelfile = parse_modelfile(response.get('modelfile', ''))
+        if digest:
+            cache_modelfile(self.base_url, digest, modelfile)
+        return {'modelfile': modelfile}
 
     def get_model_config(self, model_name):
         """Get model configuration details"""
         try:
-            response = self._handle_request(
-                requests.post,
-                'api/show',
-                json={'name': model_name}
-            )
-            if 'error' in response:
-                return {'error': response['error']}
+            result = self.get_modelfile(model_name)
+            if 'error' in result:
+                return {'error': result['error']}
 
+            modelfile = result['modelfile']
             return {
-                'modelfile': response.get('modelfile', ''),
-                'parameters': self._extract_parameters(response.get('modelfile', '')),
-                'template': self._extract_template(response.get('modelfile', '')),
-                'system': self._extract_system(response.get('modelfile', ''))
+                'modelfile': modelfile.text,
+                'parameters': modelfile.parameters,
+                'template': modelfile.template,
+                'system': modelfile.system,
+                'parsed': modelfile.to_dict()
             }
         except Exception as e:
             return {'error': str(e)}
 
-    def _extract_parameters(self, modelfile):
-        parameters = {}
-        for line in modelfile.split('\n'):
-            if line.startswith('PARAMETER'):
-                parts = line.split(' ', 2)
-                if len(parts) >= 3:
-                    key = parts[1]
-                    value = parts[2].strip('"')
-                    parameters[key] = value
-        return parameters
-
-    def _extract_template(self, modelfile):
-        start = modelfile.find('TEMPLATE')
-        if start == -1:
-            return ""
-
-        template_line = modelfile[start:].split('\n')[0]
-        template = template_line.split('"')[1] if '"' in template_line else ""
-        return template
-
-    def _extract_system(self, modelfile):
-        start = modelfile.find('SYSTEM')
-        if start == -1:
-            return ""
-
-        system_line = modelfile[start:].split('\n')[0]
-        system = system_line.split('SYSTEM', 1)[1].strip()
-        return system
+    def get_model_digest(self, model_name):
+        """Get the digest of an installed model, or None if it is not installed"""
+        model_name = normalize_model_name(model_name)
+        response = self._handle_request(requests.get, 'api/tags')
+        for model in response.get('models', []):
+            if model.get('name') == model_name or model.get('model') == model_name:
+                return model.get('digest')
+        return None
 
     def get_model_details(self, model_name):
         """Get full model details including creation date"""
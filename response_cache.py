@@ -0,0 +1,286 @@
+from models import normalize_model_name
+from collections import OrderedDict
+import threading
+import hashlib
+import time
+import json
+import os
+
+# Request fields that do not change the response
+IGNORED_FIELDS = ('stream', 'keep_alive')
+
+# Seconds a model digest is trusted before /api/tags is asked again, in case
+# the model was changed outside the manager
+DIGEST_TTL = 60
+
+# Once the disk tier exceeds its cap, the least recently used files are
+# removed until it is back under this fraction of the cap
+DISK_PRUNE_RATIO = 0.9
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(
+                enabled=os.environ.get('OLLAMA_RESPONSE_CACHE', '').lower() in ('1', 'true', 'yes'),
+                directory=os.environ.get('OLLAMA_RESPONSE_CACHE_DIR', 'response_cache'),
+                max_entries=int(os.environ.get('OLLAMA_RESPONSE_CACHE_ENTRIES', 1024)),
+                max_bytes=int(os.environ.get('OLLAMA_RESPONSE_CACHE_BYTES', 64 * 1024 * 1024)),
+                max_disk_bytes=int(os.environ.get('OLLAMA_RESPONSE_CACHE_DISK_BYTES', 1024 * 1024 * 1024))
+            )
+        return _cache
+
+
+def _model_dir_name(host, model_name):
+    return hashlib.sha256(f'{host}\n{model_name}'.encode()).hexdigest()[:32]
+
+
+class ResponseCache:
+    """Exact-match cache of Ollama responses for deterministic requests.
+
+    Embeddings are always deterministic; generate and chat requests are
+    cached only with temperature 0 or a fixed seed. Entries are keyed by a
+    hash of the canonical request and the model digest, and hold the raw
+    response lines so that streamed responses can be replayed as-is. A
+    memory LRU sits in front of a disk tier with one directory per model,
+    which is dropped when the model changes. The disk tier is capped at
+    max_disk_bytes (0 for no cap) by removing the files least recently
+    written or read.
+    """
+
+    def __init__(self, enabled=False, directory='response_cache', max_entries=1024, max_bytes=64 * 1024 * 1024,
+                 max_disk_bytes=1024 * 1024 * 1024):
+        self.enabled = enabled
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        # Size of the disk tier, measured on first use and after invalidations
+        self._disk_bytes = None
+        self._digests = {}
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self.stats = {
+            'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'invalidations': 0, 'disk_evictions': 0
+        }
+
+    @staticmethod
+    def is_deterministic(endpoint, payload):
+        if endpoint in ('embed', 'embeddings'):
+            return True
+        options = payload.get('options') or {}
+        return options.get('temperature') == 0 or options.get('seed') is not None
+
+    def make_key(self, client, endpoint, payload):
+        """Return the cache key for a request, or None when it must not be cached"""
+        if not self.enabled or not self.is_deterministic(endpoint, payload):
+            return None
+
+        model_name = normalize_model_name(payload.get('model'))
+        digest = self._get_digest(client, model_name)
+        if not digest:
+            return None
+
+        request = {key: value for key, value in payload.items() if key not in IGNORED_FIELDS}
+        # Streamed and non-streamed responses have different shapes
+        request['stream'] = payload.get('stream', endpoint in ('generate', 'chat'))
+        canonical = json.dumps(
+            {'endpoint': endpoint, 'digest': digest, 'request': request},
+            sort_keys=True,
+            separators=(',', ':')
+        )
+        return (client.base_url, model_name, hashlib.sha256(canonical.encode()).hexdigest())
+
+    def _get_digest(self, client, model_name):
+        cache_key = (client.base_url, model_name)
+        with self._lock:
+            cached = self._digests.get(cache_key)
+            if cached and time.monotonic() - cached[1] < DIGEST_TTL:
+                return cached[0]
+        digest = client.get_model_digest(model_name)
+        with self._lock:
+            if digest:
+                self._digests[cache_key] = (digest, time.monotonic())
+            else:
+                self._digests.pop(cache_key, None)
+        return digest
+
+    def _path(self, key):
+        host, model_name, digest = key
+        return os.path.join(self.directory, _model_dir_name(host, model_name), f'{digest}.ndjson')
+
+    def get(self, key):
+        """Return the cached response lines, or None on a miss"""
+        with self._lock:
+            lines = self._memory.get(key)
+            if lines is not None:
+                self._memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return lines
+
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                lines = f.read().splitlines(keepends=True)
+            # Reads count as use for the disk eviction order
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.stats['misses'] += 1
+            return None
+
+        with self._lock:
+            self.stats['disk_hits'] += 1
+            self._remember(key, lines)
+        return lines
+
+    def record(self, key, lines):
+        """Relay response lines and store them once the response has completed.
+
+        Only complete answers are stored: a generation must end with
+        "done": true, an embedding response must hold its embeddings.
+        """
+        captured = []
+        for line in lines:
+            captured.append(line)
+            yield line
+
+        try:
+            final = json.loads(captured[-1]) if captured else {}
+        except json.JSONDecodeError:
+            return
+        if 'error' not in final and (final.get('done') or 'embeddings' in final or 'embedding' in final):
+            self.put(key, captured)
+
+    def put(self, key, lines):
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            tmp_path = f'{path}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.writelines(lines)
+            os.replace(tmp_path, path)
+            self._account_disk(sum(len(line) for line in lines) - previous)
+        except OSError as e:
+            print(f"Failed to write response cache entry: {str(e)}")
+
+        with self._lock:
+            self.stats['stores'] += 1
+            self._remember(key, lines)
+
+    def _remember(self, key, lines):
+        """Insert into the memory LRU. Must be called with the lock held."""
+        size = sum(len(line) for line in lines)
+        if size > self.max_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= sum(len(line) for line in previous)
+        self._memory[key] = lines
+        self._memory_bytes += size
+        while len(self._memory) > self.max_entries or self._memory_bytes > self.max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= sum(len(line) for line in evicted)
+
+    def _disk_files(self):
+        """(mtime, size, path) of every entry file of the disk tier"""
+        files = []
+        if not os.path.isdir(self.directory):
+            return files
+        for model_dir in os.listdir(self.directory):
+            path = os.path.join(self.directory, model_dir)
+            if not os.path.isdir(path):
+                continue
+            for name in os.listdir(path):
+                if not name.endswith('.ndjson'):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(path, name))
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, os.path.join(path, name)))
+        return files
+
+    def _account_disk(self, added):
+        """Track the disk tier size and evict the least recently used files past max_disk_bytes"""
+        if not self.max_disk_bytes:
+            return
+        with self._disk_lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, size, _ in self._disk_files())
+            else:
+                self._disk_bytes += added
+            if self._disk_bytes <= self.max_disk_bytes:
+                return
+
+            files = sorted(self._disk_files())
+            total = sum(size for _, size, _ in files)
+            evicted = 0
+            for _, size, path in files:
+                if total <= self.max_disk_bytes * DISK_PRUNE_RATIO:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                evicted += 1
+            self._disk_bytes = total
+        with self._lock:
+            self.stats['disk_evictions'] += evicted
+
+    def invalidate_model(self, host, model_name):
+        """Drop every entry of a model whose digest may have changed"""
+        model_name = normalize_model_name(model_name)
+        with self._lock:
+            self._digests.pop((host, model_name), None)
+            for key in [key for key in self._memory if key[0] == host and key[1] == model_name]:
+                self._memory_bytes -= sum(len(line) for line in self._memory.pop(key))
+            self.stats['invalidations'] += 1
+
+        with self._disk_lock:
+            self._disk_bytes = None
+        model_dir = os.path.join(self.directory, _model_dir_name(host, model_name))
+        if os.path.isdir(model_dir):
+            for name in os.listdir(model_dir):
+                try:
+                    os.remove(os.path.join(model_dir, name))
+                except OSError:
+                    pass
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            self._digests.clear()
+        with self._disk_lock:
+            self._disk_bytes = None
+        if os.path.isdir(self.directory):
+            for model_dir in os.listdir(self.directory):
+                path = os.path.join(self.directory, model_dir)
+                for name in os.listdir(path):
+                    try:
+                        os.remove(os.path.join(path, name))
+                    except OSError:
+                        pass
+
+    def get_stats(self):
+        with self._lock:
+            hits = self.stats['memory_hits'] + self.stats['disk_hits']
+            lookups = hits + self.stats['misses']
+            return {
+                **self.stats,
+                'enabled': self.enabled,
+                'hit_ratio': hits / lookups if lookups else 0.0,
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_bytes,
+                'disk_bytes': self._disk_bytes,
+                'max_disk_bytes': self.max_disk_bytes
+            }
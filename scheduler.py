@@ -0,0 +1,284 @@
+import requests
+from models import ModelUsageRollup, SchedulerPolicy, normalize_model_name
+from datetime import datetime, timedelta
+import threading
+import math
+
+DEFAULT_POLICY = {
+    'enabled': False,       # run the scheduler in the background
+    'interval': 60,         # seconds between two background runs
+    'pinned': [],           # models always kept resident
+    'windows': [],          # [{'models': [...], 'start': '08:00', 'end': '18:00', 'days': [0, 1, 2, 3, 4]}]
+    'max_vram': 0,          # VRAM budget in bytes, 0 disables budget checks and unloading
+    'min_headroom': 0.1,    # fraction of max_vram to keep free before unloading cold models
+    'lookback_hours': 24,   # usage history considered for demand scores
+    'half_life_hours': 6,   # older usage counts half as much every half_life_hours
+    'min_score': 1.0,       # minimal demand score for a model to be considered hot
+    'max_hot': 3,           # maximum number of models preloaded from usage alone
+    'keep_alive': '30m'     # keep_alive sent to models preloaded from usage
+}
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(client):
+    """Return the scheduler for the client's server, creating it on first use"""
+    with _schedulers_lock:
+        scheduler = _schedulers.get(client.base_url)
+        if scheduler is None:
+            scheduler = _schedulers[client.base_url] = PreloadScheduler(client)
+        return scheduler
+
+
+def _parse_time(value):
+    hours, minutes = value.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _check_time(value):
+    if not isinstance(value, str):
+        raise ValueError(f'Invalid time: {value!r}, expected HH:MM')
+    try:
+        hours, minutes = (int(part) for part in value.split(':'))
+    except ValueError:
+        raise ValueError(f'Invalid time: {value!r}, expected HH:MM')
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        raise ValueError(f'Invalid time: {value!r}, expected HH:MM')
+
+
+def _check_names(key, value):
+    if not isinstance(value, list) or not all(isinstance(name, str) and name for name in value):
+        raise ValueError(f'{key} must be a list of model names')
+
+
+def validate_policy(changes):
+    """Raise ValueError unless every key of changes is a known, well-formed policy setting"""
+    if not isinstance(changes, dict):
+        raise ValueError('Policy must be a JSON object')
+    unknown = set(changes) - set(DEFAULT_POLICY)
+    if unknown:
+        raise ValueError(f'Unknown policy keys: {", ".join(sorted(unknown))}')
+
+    for key, value in changes.items():
+        if key == 'enabled':
+            if not isinstance(value, bool):
+                raise ValueError('enabled must be true or false')
+        elif key in ('interval', 'lookback_hours', 'half_life_hours'):
+            if not _is_number(value) or value <= 0:
+                raise ValueError(f'{key} must be a positive number')
+        elif key in ('max_vram', 'min_score'):
+            if not _is_number(value) or value < 0:
+                raise ValueError(f'{key} must be a non-negative number')
+        elif key == 'max_hot':
+            if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+                raise ValueError('max_hot must be a non-negative integer')
+        elif key == 'min_headroom':
+            if not _is_number(value) or not 0 <= value < 1:
+                raise ValueError('min_headroom must be between 0 (included) and 1 (excluded)')
+        elif key == 'keep_alive':
+            if not isinstance(value, str) and not _is_number(value):
+                raise ValueError('keep_alive must be a duration string or a number of seconds')
+        elif key == 'pinned':
+            _check_names(key, value)
+        elif key == 'windows':
+            if not isinstance(value, list):
+                raise ValueError('windows must be a list')
+            for window in value:
+                if not isinstance(window, dict):
+                    raise ValueError('Each window must be an object')
+                _check_names('Window models', window.get('models'))
+                _check_time(window.get('start'))
+                _check_time(window.get('end'))
+                days = window.get('days', [])
+                if not isinstance(days, list) or not all(
+                        isinstance(day, int) and not isinstance(day, bool) and 0 <= day <= 6 for day in days):
+                    raise ValueError('Window days must be a list of weekdays from 0 (Monday) to 6')
+
+
+class PreloadScheduler:
+    """Keep in-demand models resident and unload cold ones when VRAM runs low.
+
+    Demand comes from the hourly usage rollups with an exponential decay,
+    residency from /api/ps. Each run produces a list of decisions
+    (preload, keep, unload, skip, idle) that is applied through
+    keep_alive requests and kept for the API.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        stored = SchedulerPolicy.get_policy(client.base_url) or {}
+        try:
+            validate_policy(stored)
+        except ValueError as e:
+            # Policies saved before validation existed may hold values that would stop every run
+            print(f"Ignoring invalid scheduler policy for {client.base_url}: {str(e)}")
+            stored = {}
+        self.policy = {**DEFAULT_POLICY, **stored}
+        self.last_run = None
+        self.last_decisions = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.start_if_enabled()
+
+    def update_policy(self, changes):
+        validate_policy(changes)
+        self.policy = {**self.policy, **changes}
+        SchedulerPolicy.save_policy(self.client.base_url, self.policy)
+        self.start_if_enabled()
+        return self.policy
+
+    def start_if_enabled(self):
+        if self.policy['enabled'] and not (self._thread and self._thread.is_alive()):
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+        elif not self.policy['enabled'] and self._thread:
+            self._stop.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run()
+            except Exception as e:
+                print(f"Preload scheduler failed for {self.client.base_url}: {str(e)}")
+            self._stop.wait(self.policy['interval'])
+
+    def run(self, dry_run=False):
+        """Plan and, unless dry_run, apply the decisions"""
+        with self._lock:
+            decisions = self.plan()
+            if not dry_run:
+                self.apply(decisions)
+                self.last_run = datetime.utcnow()
+                self.last_decisions = decisions
+            return decisions
+
+    def get_state(self):
+        return {
+            'policy': self.policy,
+            'running': bool(self._thread and self._thread.is_alive()),
+            'last_run': self.last_run.isoformat() if self.last_run else None,
+            'decisions': self.last_decisions
+        }
+
+    def demand_scores(self, now=None):
+        """Usage counts per model over the lookback, decayed by age"""
+        now = now or datetime.utcnow()
+        activity = ModelUsageRollup.get_activity(now - timedelta(hours=self.policy['lookback_hours']))
+        decay = math.log(2) / self.policy['half_life_hours']
+        scores = {}
+        for model_name, buckets in activity.items():
+            # Rows logged before names were normalized may hold "llama3" and "llama3:latest"
+            model_name = normalize_model_name(model_name)
+            scores[model_name] = scores.get(model_name, 0.0) + sum(
+                count * math.exp(-decay * max((now - bucket_start).total_seconds() / 3600, 0))
+                for bucket_start, count in buckets
+            )
+        return scores
+
+    def active_windows(self, now=None):
+        """Models of the time windows open now, with the seconds left in each window"""
+        now = now or datetime.now()
+        minute = now.hour * 60 + now.minute
+        active = {}
+        for window in self.policy['windows']:
+            if 'days' in window and now.weekday() not in window['days']:
+                continue
+            start, end = _parse_time(window['start']), _parse_time(window['end'])
+            if start <= end:
+                is_open = start <= minute < end
+                remaining = end - minute
+            else:
+                # Window spanning midnight
+                is_open = minute >= start or minute < end
+                remaining = (end - minute) % (24 * 60)
+            if is_open:
+                for model_name in map(normalize_model_name, window['models']):
+                    active[model_name] = max(active.get(model_name, 0), remaining * 60)
+        return active
+
+    def plan(self):
+        running = self.client.list_running()
+        if 'error' in running:
+            raise RuntimeError(running['error'])
+        resident = {normalize_model_name(model['name']): model.get('size_vram', model.get('size', 0)) for model in running.get('models', [])}
+
+        tags = self.client._handle_request(requests.get, 'api/tags')
+        sizes = {normalize_model_name(model['name']): model.get('size', 0) for model in tags.get('models', [])}
+        sizes.update(resident)
+
+        scores = self.demand_scores()
+        windows = self.active_windows()
+
+        candidates = []
+        for model_name in map(normalize_model_name, self.policy['pinned']):
+            candidates.append((model_name, 'pinned', -1))
+        for model_name, remaining in windows.items():
+            candidates.append((model_name, 'window', f'{remaining}s'))
+        hot = sorted(
+            (name for name, score in scores.items() if score >= self.policy['min_score']),
+            key=lambda name: scores[name],
+            reverse=True
+        )
+        for model_name in hot[:self.policy['max_hot']]:
+            candidates.append((model_name, 'demand', self.policy['keep_alive']))
+
+        max_vram = self.policy['max_vram']
+        decisions = []
+        selected = {}
+        used = 0
+        for model_name, reason, keep_alive in candidates:
+            if model_name in selected:
+                continue
+            decision = {
+                'model': model_name,
+                'reason': reason,
+                'score': round(scores.get(model_name, 0.0), 3),
+                'size_vram': sizes.get(model_name, 0),
+                'keep_alive': keep_alive
+            }
+            if model_name not in sizes:
+                decision.update(action='skip', reason='not_installed')
+            elif max_vram and reason != 'pinned' and used + decision['size_vram'] > max_vram:
+                decision.update(action='skip', reason='vram_budget')
+            else:
+                decision['action'] = 'keep' if model_name in resident else 'preload'
+                selected[model_name] = decision
+                used += decision['size_vram']
+            decisions.append(decision)
+
+        # Coldest resident models go first when the budget leaves too little headroom
+        cold = sorted((name for name in resident if name not in selected), key=lambda name: scores.get(name, 0.0))
+        projected = used + sum(resident[name] for name in cold)
+        limit = max_vram * (1 - self.policy['min_headroom'])
+        for model_name in cold:
+            decision = {
+                'model': model_name,
+                'reason': 'cold',
+                'score': round(scores.get(model_name, 0.0), 3),
+                'size_vram': resident[model_name],
+                'keep_alive': None,
+                'action': 'idle'
+            }
+            if max_vram and projected > limit:
+                decision.update(action='unload', reason='vram_headroom', keep_alive='0s')
+                projected -= resident[model_name]
+            decisions.append(decision)
+
+        return decisions
+
+    def apply(self, decisions):
+        # Free VRAM before loading anything
+        ordered = [d for d in decisions if d['action'] == 'unload'] + \
+                  [d for d in decisions if d['action'] in ('keep', 'preload')]
+        for decision in ordered:
+            result = self.client.set_keep_alive(decision['model'], decision['keep_alive'])
+            decision['applied'] = result.get('success', False)
+            if not decision['applied']:
+                decision['error'] = result.get('error')
@@ -521,7 +521,223 @@ function formatDate(dateStr) {
     }
 }
 
+// Keyed, virtualized table rendering: rows are created once per model and
+// only re-created when that model changes, and only the rows in view (plus
+// an overscan margin) are attached to the DOM.
+const ROW_OVERSCAN = 10;
+const DEFAULT_ROW_HEIGHT = 45;
+
+class KeyedTable {
+    constructor(tbody, scrollContainer, colspan, renderRow, compare) {
+        this.tbody = tbody;
+        this.scrollContainer = scrollContainer;
+        this.colspan = colspan;
+        this.renderRow = renderRow;
+        this.compare = compare;
+        this.items = new Map();
+        this.rows = new Map();
+        this.order = [];
+        this.rowHeight = DEFAULT_ROW_HEIGHT;
+        this.emptyMessage = '';
+
+        if (scrollContainer) {
+            let scheduled = false;
+            scrollContainer.addEventListener('scroll', () => {
+                if (scheduled) return;
+                scheduled = true;
+                requestAnimationFrame(() => {
+                    scheduled = false;
+                    this.render();
+                });
+            });
+        }
+    }
+
+    setAll(models, emptyMessage) {
+        this.items = new Map(models.map(model => [model.name, model]));
+        this.rows.clear();
+        this.emptyMessage = emptyMessage;
+        this.reorder();
+        this.render();
+    }
+
+    applyDelta(delta, emptyMessage) {
+        delta.removed.forEach(key => {
+            this.items.delete(key);
+            this.rows.delete(key);
+        });
+        delta.added.concat(delta.changed).forEach(model => {
+            this.items.set(model.name, model);
+            this.rows.delete(model.name);
+        });
+        this.emptyMessage = emptyMessage;
+        if (delta.added.length || delta.changed.length || delta.removed.length) {
+            this.reorder();
+        }
+        this.render();
+    }
+
+    // Diff a full list against the current one, for endpoints without delta support
+    replace(models, emptyMessage) {
+        const incoming = new Map(models.map(model => [model.name, model]));
+        const delta = { added: [], changed: [], removed: [] };
+        this.items.forEach((model, key) => {
+            if (!incoming.has(key)) delta.removed.push(key);
+        });
+        incoming.forEach((model, key) => {
+            if (!this.items.has(key)) {
+                delta.added.push(model);
+            } else if (JSON.stringify(this.items.get(key)) !== JSON.stringify(model)) {
+                delta.changed.push(model);
+            }
+        });
+        this.applyDelta(delta, emptyMessage);
+    }
+
+    showMessage(message) {
+        this.items.clear();
+        this.rows.clear();
+        this.order = [];
+        this.tbody.innerHTML = `<tr><td colspan="${this.colspan}" class="center aligned">${message}</td></tr>`;
+    }
+
+    reorder() {
+        this.order = Array.from(this.items.keys()).sort((a, b) => this.compare(this.items.get(a), this.items.get(b)));
+    }
+
+    getRow(key) {
+        let row = this.rows.get(key);
+        if (!row) {
+            const container = document.createElement('tbody');
+            container.innerHTML = this.renderRow(this.items.get(key)).trim();
+            row = container.firstElementChild;
+            this.rows.set(key, row);
+        }
+        return row;
+    }
+
+    spacer(height) {
+        const row = document.createElement('tr');
+        row.className = 'virtual-spacer';
+        row.style.height = `${height}px`;
+        return row;
+    }
+
+    render() {
+        if (!this.order.length) {
+            this.tbody.innerHTML = `<tr><td colspan="${this.colspan}" class="center aligned">${this.emptyMessage}</td></tr>`;
+            return;
+        }
+
+        let first = 0;
+        let last = this.order.length;
+        if (this.scrollContainer) {
+            const top = this.scrollContainer.scrollTop;
+            const height = this.scrollContainer.clientHeight || window.innerHeight;
+            first = Math.max(0, Math.floor(top / this.rowHeight) - ROW_OVERSCAN);
+            last = Math.min(this.order.length, Math.ceil((top + height) / this.rowHeight) + ROW_OVERSCAN);
+        }
+
+        const visible = this.order.slice(first, last).map(key => this.getRow(key));
+        this.tbody.replaceChildren(
+            this.spacer(first * this.rowHeight),
+            ...visible,
+            this.spacer((this.order.length - last) * this.rowHeight)
+        );
+
+        if (visible.length && visible[0].offsetHeight) {
+            this.rowHeight = visible[0].offsetHeight;
+        }
+    }
+}
+
+let localModelsTable = null;
+let runningModelsTable = null;
+let localModelsVersion = null;
+
+function getLocalModelsTable() {
+    if (!localModelsTable) {
+        localModelsTable = new KeyedTable(
+            document.querySelector('#localModels tbody'),
+            document.getElementById('localModelsScroll'),
+            8,
+            renderLocalModelRow,
+            (a, b) => (b.modified_at || '').localeCompare(a.modified_at || '') || a.name.localeCompare(b.name)
+        );
+    }
+    return localModelsTable;
+}
+
+function getRunningModelsTable() {
+    if (!runningModelsTable) {
+        runningModelsTable = new KeyedTable(
+            document.querySelector('#runningModels tbody'),
+            null,
+            7,
+            renderRunningModelRow,
+            (a, b) => a.name.localeCompare(b.name)
+        );
+    }
+    return runningModelsTable;
+}
+
+function renderLocalModelRow(model) {
+    const formattedDate = formatDate(model.modified_at);
+    const checked = selectedModels.has(model.name) ? 'checked' : '';
+
+    return `
+    <tr data-key="${model.name}">
+        <td class="collapsing">
+            <div class="ui fitted checkbox">
+                <input type="checkbox" data-model-name="${model.name}" ${checked} onchange="toggleModelSelection(this, '${model.name}')">
+                <label></label>
+            </div>
+        </td>
+        <td>${model.name}</td>
+        <td>${formattedDate}</td>
+        <td>${formatBytes(model.size)}</td>
+        <td>${model.details?.format || 'N/A'}</td>
+        <td>${model.details?.family || 'N/A'}</td>
+        <td>${model.details?.parameter_size || 'N/A'}</td>
+        <td class="center aligned">
+            <div class="ui tiny buttons">
+                <button class="ui button" onclick="showModelConfig('${model.name}')">
+                    <i class="cog icon"></i> Config
+                </button>
+                <button class="ui teal button" onclick="showModelStats('${model.name}')">
+                    <i class="chart bar icon"></i> Stats
+                </button>
+                <button class="ui negative button" onclick="deleteModel('${model.name}')">
+                    <i class="trash icon"></i> Supprimer
+                </button>
+            </div>
+        </td>
+    </tr>
+    `;
+}
+
+function renderRunningModelRow(model) {
+    const formattedDate = formatDate(model.modified_at);
+
+    return `
+    <tr data-key="${model.name}">
+        <td>${model.name}</td>
+        <td>${formattedDate}</td>
+        <td>${formatBytes(model.size)}</td>
+        <td>${model.details?.format || 'N/A'}</td>
+        <td>${model.details?.family || 'N/A'}</td>
+        <td>${model.details?.parameter_size || 'N/A'}</td>
+        <td class="center aligned">
+            <button class="ui red tiny button" onclick="stopModel('${model.name}')">
+                <i class="stop icon"></i> Arrêter
+            </button>
+        </td>
+    </tr>
+    `;
+}
+
 async function refreshLocalModels() {
+    const table = getLocalModelsTable();
     try {
         const serverStatusResponse = await fetch('/api/server/status', {
             headers: { 'X-Ollama-URL': ollamaUrl }
@@ -529,59 +745,30 @@ async function refreshLocalModels() {
         const serverStatus = await serverStatusResponse.json();
 
         if (serverStatus.status !== 'running') {
-            const tbody = document.querySelector('#localModels tbody');
-            tbody.innerHTML = '<tr><td colspan="8" class="center aligned">Serveur Ollama non connecté</td></tr>';
+            localModelsVersion = null;
+            table.showMessage('Serveur Ollama non connecté');
             return;
         }
 
-        const response = await fetch('/api/models', {
+        // Only ask for what changed since the last version we rendered
+        const url = localModelsVersion ? `/api/models?since=${encodeURIComponent(localModelsVersion)}` : '/api/models';
+        const response = await fetch(url, {
             headers: { 'X-Ollama-URL': ollamaUrl }
         });
         if (!response.ok) {
-            const tbody = document.querySelector('#localModels tbody');
-            tbody.innerHTML = '<tr><td colspan="8" class="center aligned">Impossible de récupérer les modèles</td></tr>';
+            localModelsVersion = null;
+            table.showMessage('Impossible de récupérer les modèles');
             return;
         }
 
         const data = await response.json();
-        const tbody = document.querySelector('#localModels tbody');
-
-        console.log('Received models data:', data.models); // Debug log
-
-        tbody.innerHTML = data.models.map(model => {
-            console.log('Processing model:', model.name, 'modified_at:', model.modified_at); // Debug log
-            const formattedDate = formatDate(model.modified_at);
-
-            return `
-            <tr>
-                <td class="collapsing">
-                    <div class="ui fitted checkbox">
-                        <input type="checkbox" data-model-name="${model.name}" onchange="toggleModelSelection(this, '${model.name}')">
-                        <label></label>
-                    </div>
-                </td>
-                <td>${model.name}</td>
-                <td>${formattedDate}</td>
-                <td>${formatBytes(model.size)}</td>
-                <td>${model.details?.format || 'N/A'}</td>
-                <td>${model.details?.family || 'N/A'}</td>
-                <td>${model.details?.parameter_size || 'N/A'}</td>
-                <td class="center aligned">
-                    <div class="ui tiny buttons">
-                        <button class="ui button" onclick="showModelConfig('${model.name}')">
-                            <i class="cog icon"></i> Config
-                        </button>
-                        <button class="ui teal button" onclick="showModelStats('${model.name}')">
-                            <i class="chart bar icon"></i> Stats
-                        </button>
-                        <button class="ui negative button" onclick="deleteModel('${model.name}')">
-                            <i class="trash icon"></i> Supprimer
-                        </button>
-                    </div>
-                </td>
-            </tr>
-            `;
-        }).join('') || '<tr><td colspan="8" class="center aligned">Aucun modèle installé</td></tr>';
+        if (data.full) {
+            table.setAll(data.models, 'Aucun modèle installé');
+        } else {
+            data.removed.forEach(name => selectedModels.delete(name));
+            table.applyDelta(data, 'Aucun modèle installé');
+        }
+        localModelsVersion = data.version;
     } catch (error) {
         console.error('Error refreshing local models:', error);
         showMessage('Erreur', error.message, true);
@@ -589,6 +776,7 @@ async function refreshLocalModels() {
 }
 
 async function refreshRunningModels() {
+    const table = getRunningModelsTable();
     try {
         const serverStatusResponse = await fetch('/api/server/status', {
             headers: { 'X-Ollama-URL': ollamaUrl }
@@ -596,8 +784,7 @@ async function refreshRunningModels() {
         const serverStatus = await serverStatusResponse.json();
 
         if (serverStatus.status !== 'running') {
-            const tbody = document.querySelector('#runningModels tbody');
-            tbody.innerHTML = '<tr><td colspan="7" class="center aligned">Serveur Ollama non connecté</td></tr>';
+            table.showMessage('Serveur Ollama non connecté');
             return;
         }
 
@@ -605,36 +792,12 @@ async function refreshRunningModels() {
             headers: { 'X-Ollama-URL': ollamaUrl }
         });
         if (!response.ok) {
-            const tbody = document.querySelector('#runningModels tbody');
-            tbody.innerHTML = '<tr><td colspan="7" class="center aligned">Impossible de récupérer les modèles en cours d\'exécution</td></tr>';
+            table.showMessage('Impossible de récupérer les modèles en cours d\'exécution');
             return;
         }
 
         const data = await response.json();
-        const tbody = document.querySelector('#runningModels tbody');
-
-        console.log('Received running models data:', data.models); // Debug log
-
-        tbody.innerHTML = data.models.map(model => {
-            console.log('Processing running model:', model.name, 'modified_at:', model.modified_at); // Debug log
-            const formattedDate = formatDate(model.modified_at);
-
-            return `
-            <tr>
-                <td>${model.name}</td>
-                <td>${formattedDate}</td>
-                <td>${formatBytes(model.size)}</td>
-                <td>${model.details?.format || 'N/A'}</td>
-                <td>${model.details?.family || 'N/A'}</td>
-                <td>${model.details?.parameter_size || 'N/A'}</td>
-                <td class="center aligned">
-                    <button class="ui red tiny button" onclick="stopModel('${model.name}')">
-                        <i class="stop icon"></i> Arrêter
-                    </button>
-                </td>
-            </tr>
-            `;
-        }).join('') || '<tr><td colspan="7" class="center aligned">Aucun modèle en cours d\'exécution</td></tr>';
+        table.replace(data.models, 'Aucun modèle en cours d\'exécution');
     } catch (error) {
         console.error('Error refreshing running models:', error);
         showMessage('Erreur', error.message, true);
@@ -699,16 +862,23 @@ window.toggleTheme = function() {
 
 // Toggle all model checkboxes
 window.toggleAllModels = function() {
-    const checkboxes = document.querySelectorAll('#localModels tbody input[type="checkbox"]');
     const masterCheckbox = document.querySelector('#localModels thead input[type="checkbox"]');
     const isChecked = masterCheckbox.checked;
 
-    checkboxes.forEach(checkbox => {
-        checkbox.checked = isChecked;
-        if (checkbox.dataset.modelName) {
-            toggleModelSelection(checkbox, checkbox.dataset.modelName);
+    // Rows outside the visible window are not in the DOM, so select by key
+    const table = getLocalModelsTable();
+    table.items.forEach((model, name) => {
+        if (isChecked) {
+            selectedModels.add(name);
+        } else {
+            selectedModels.delete(name);
         }
     });
+    table.rows.forEach(row => {
+        const checkbox = row.querySelector('input[type="checkbox"]');
+        if (checkbox) checkbox.checked = isChecked;
+    });
+    updateCompareButton();
 };
 
 // Compare selected models
@@ -870,7 +1040,7 @@ window.toggleModelSelection = function(checkbox, modelName) {
     } else {
         selectedModels.delete(modelName);
         // Décocher la case "Tous Sélectionner" si un modèle est décoché
-        document.querySelector('#selectAllCheckbox').checked = false;
+        document.querySelector('#localModels thead input[type="checkbox"]').checked = false;
     }
     updateCompareButton();
 };
@@ -903,8 +1073,12 @@ window.compareSelectedModels = async function() {
             });
         }
 
+        const benchmarks = await fetch(`/api/benchmarks?models=${encodeURIComponent(modelsArray.join(','))}`, {
+            headers: { 'X-Ollama-URL': ollamaUrl }
+        }).then(res => res.json());
+
         const comparisonContent = document.getElementById('modelComparison');
-        comparisonContent.innerHTML = comparisons.map(model => `
+        comparisonContent.innerHTML = renderBenchmarkRanking(benchmarks.results || []) + comparisons.map(model => `
             <div class="ui segment">
                 <h3 class="ui header">${model.name}</h3>
                 <div class="ui statistics tiny">
@@ -928,27 +1102,97 @@ window.compareSelectedModels = async function() {
             </div>
         `).join('');
 
-        $('#compareModal').modal('show');
+        $('#comparisonModal').modal('show');
     } catch (error) {
         showMessage('Erreur', error.message, true);
     }
 };
 
+// Benchmark results ranked by generation speed (the API returns them sorted)
+function renderBenchmarkRanking(results) {
+    const rows = results.map((result, index) => `
+        <tr>
+            <td>${index + 1}</td>
+            <td>${result.model_name}</td>
+            <td>${(result.generation_tokens_per_second || 0).toFixed(1)}</td>
+            <td>${(result.prompt_tokens_per_second || 0).toFixed(1)}</td>
+            <td>${(result.time_to_first_token || 0).toFixed(2)}s</td>
+            <td>${(result.load_duration || 0).toFixed(2)}s</td>
+            <td>${formatBytes(result.peak_vram || 0)}</td>
+            <td>${formatDate(result.timestamp)}</td>
+        </tr>
+    `).join('') || '<tr><td colspan="8" class="center aligned">Aucun benchmark enregistré pour ces modèles</td></tr>';
+
+    return `
+        <div class="ui segment" id="benchmarkRanking">
+            <div class="ui clearing">
+                <h3 class="ui left floated header">Benchmark</h3>
+                <button class="ui right floated primary button" onclick="runBenchmark(this)">
+                    <i class="stopwatch icon"></i> Lancer le benchmark
+                </button>
+            </div>
+            <table class="ui celled table">
+                <thead>
+                    <tr>
+                        <th>#</th>
+                        <th>Modèle</th>
+                        <th>Génération (tokens/s)</th>
+                        <th>Prompt (tokens/s)</th>
+                        <th>Premier token</th>
+                        <th>Chargement</th>
+                        <th>VRAM max</th>
+                        <th>Date</th>
+                    </tr>
+                </thead>
+                <tbody>${rows}</tbody>
+            </table>
+        </div>
+    `;
+}
+
+window.runBenchmark = async function(button) {
+    button.classList.add('loading', 'disabled');
+    try {
+        const response = await fetch('/api/benchmarks/run', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-Ollama-URL': ollamaUrl
+            },
+            body: JSON.stringify({ models: Array.from(selectedModels) })
+        });
+
+        const data = await response.json();
+        if (!response.ok) {
+            throw new Error(data.error || 'Échec du benchmark');
+        }
+
+        const failed = data.results.filter(result => result.error);
+        if (failed.length) {
+            showMessage('Erreur', failed.map(result => `${result.model_name}: ${result.error}`).join('\n'), true);
+        }
+        await compareSelectedModels();
+    } catch (error) {
+        showMessage('Erreur', error.message, true);
+    } finally {
+        button.classList.remove('loading', 'disabled');
+    }
+};
+
 
 window.batchDeleteModels = async function() {
-    const selectedModels = document.querySelectorAll('input[type="checkbox"]:checked');
-    if (selectedModels.length === 0) {
+    const modelNames = Array.from(selectedModels);
+    if (modelNames.length === 0) {
         showMessage('Erreur', 'Veuillez sélectionner au moins un modèle', true);
         return;
     }
 
-    if (!confirm(`Êtes-vous sûr de vouloir supprimer ${selectedModels.length} modèle(s) ?`)) {
+    if (!confirm(`Êtes-vous sûr de vouloir supprimer ${modelNames.length} modèle(s) ?`)) {
         return;
     }
 
     const results = [];
-    for (const checkbox of selectedModels) {
-        const modelName = checkbox.getAttribute('data-model-name');
+    for (const modelName of modelNames) {
         try {
             const response = await fetch('/api/models/delete', {
                 method: 'POST',
@@ -1097,6 +1341,25 @@ window.removeParameter = function(button) {
     }
 };
 
+window.batchConfigureModels = function() {
+    if (selectedModels.size === 0) {
+        showMessage('Erreur', 'Veuillez sélectionner au moins un modèle', true);
+        return;
+    }
+
+    document.getElementById('selectedModels').innerHTML = Array.from(selectedModels).map(modelName => `
+        <div class="item">
+            <i class="cube icon"></i>
+            ${modelName}
+        </div>
+    `).join('');
+    document.getElementById('systemPrompt').value = '';
+    document.getElementById('template').value = '';
+    document.getElementById('parameters').innerHTML = '';
+
+    $('#configModal').modal('show');
+};
+
 window.saveModelConfig = async function() {
     const selectedModelsList = document.getElementById('selectedModels');
     const modelItems = selectedModelsList.getElementsByClassName('item');
@@ -1125,6 +1388,13 @@ window.saveModelConfig = async function() {
         parameters: parameters
     };
 
+    if (modelItems.length > 1) {
+        const models = Array.from(modelItems).map(item => item.textContent.trim());
+        $('#configModal').modal('hide');
+        await saveModelsConfigBatch(models, config);
+        return;
+    }
+
     try {
         const response = await fetch(`/api/models/${modelName}/config`, {
             method: 'POST',
@@ -1141,13 +1411,66 @@ window.saveModelConfig = async function() {
         }
 
         $('#configModal').modal('hide');
-        showMessage('Success', 'Model configuration updated successfully');
+        showMessage('Success', data.message || 'Model configuration updated successfully');
         refreshAll();
     } catch (error) {
         showMessage('Error', error.message, true);
     }
 };
 
+// Apply one configuration to several models, showing streamed progress per model
+async function saveModelsConfigBatch(models, config) {
+    const resultsList = document.getElementById('batchResults');
+    resultsList.innerHTML = models.map(model => `
+        <div class="ui message" data-model="${model}">
+            <div class="header">${model}</div>
+            <p>En attente...</p>
+        </div>
+    `).join('');
+    $('#batchResultsModal').modal('show');
+
+    const updateModel = (event) => {
+        const item = resultsList.querySelector(`[data-model="${CSS.escape(event.model)}"]`);
+        if (!item) return;
+        if (event.done) {
+            item.className = `ui message ${event.success ? 'positive' : 'negative'}`;
+            item.querySelector('p').textContent = event.success ? event.message : event.error;
+        } else {
+            item.querySelector('p').textContent = event.status;
+        }
+    };
+
+    try {
+        const response = await fetch('/api/models/config/batch', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-Ollama-URL': ollamaUrl
+            },
+            body: JSON.stringify({ models, ...config })
+        });
+        if (!response.ok) {
+            const data = await response.json();
+            throw new Error(data.error || 'Échec de la configuration');
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+            lines.filter(line => line.trim()).forEach(line => updateModel(JSON.parse(line)));
+        }
+        refreshAll();
+    } catch (error) {
+        showMessage('Erreur', error.message, true);
+    }
+}
+
 // Server status check interval
 setInterval(checkServerStatus, 30000);
 
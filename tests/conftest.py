@@ -0,0 +1,9 @@
+import tempfile
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep test runs out of the real usage database; models.py reads this on import
+_database_dir = tempfile.mkdtemp(prefix='ollama-manager-tests-')
+os.environ.setdefault('OLLAMA_STATS_DATABASE_URL', f'sqlite:///{os.path.join(_database_dir, "ollama_stats.db")}')
@@ -0,0 +1,175 @@
+"""BenchmarkRunner against a local stand-in for the Ollama server.
+
+The stand-in streams /api/generate with fixed Ollama timings, reports the
+model in /api/ps once it is loaded and lists it in /api/tags, so every
+stored measurement can be checked against known values.
+"""
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import threading
+import json
+import time
+
+import pytest
+
+import benchmark
+from benchmark import BenchmarkRunner
+from models import BenchmarkResult
+from ollama_client import OllamaClient
+
+MODEL = 'llama3:latest'
+DIGEST = 'sha256:0123456789abcdef'
+SIZE_VRAM = 5_368_709_120
+FIRST_TOKEN_DELAY = 0.05
+LOAD_DURATION = 2.5  # seconds, reported on the first prompt after an unload
+
+# Nanosecond timings reported in the final chunk of every generation
+PROMPT_EVAL_COUNT = 30
+PROMPT_EVAL_DURATION = 1_000_000_000
+EVAL_COUNT = 50
+EVAL_DURATION = 2_000_000_000
+
+
+class FakeOllama:
+    def __init__(self):
+        self.loaded = False
+        self.generations = 0
+        self.unloads = 0
+        self.lock = threading.Lock()
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    state = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/api/tags':
+            return self._send_json({'models': [{'name': MODEL, 'model': MODEL, 'digest': DIGEST, 'size': SIZE_VRAM}]})
+        if self.path == '/api/ps':
+            with self.state.lock:
+                loaded = self.state.loaded
+            models = [{'name': MODEL, 'model': MODEL, 'size_vram': SIZE_VRAM}] if loaded else []
+            return self._send_json({'models': models})
+        self.send_error(404)
+
+    def do_POST(self):
+        if self.path != '/api/generate':
+            return self.send_error(404)
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+
+        if payload.get('keep_alive') == '0s':
+            with self.state.lock:
+                self.state.loaded = False
+                self.state.unloads += 1
+            return self._send_json({'model': payload['model'], 'done': True})
+
+        with self.state.lock:
+            cold = not self.state.loaded
+            self.state.loaded = True
+            self.state.generations += 1
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        time.sleep(FIRST_TOKEN_DELAY)
+        for token in ('Hello', ' world'):
+            self._write_chunk({'model': payload['model'], 'response': token, 'done': False})
+        self._write_chunk({
+            'model': payload['model'],
+            'response': '',
+            'done': True,
+            'load_duration': int(LOAD_DURATION * 1e9) if cold else 1_000_000,
+            'prompt_eval_count': PROMPT_EVAL_COUNT,
+            'prompt_eval_duration': PROMPT_EVAL_DURATION,
+            'eval_count': EVAL_COUNT,
+            'eval_duration': EVAL_DURATION,
+            'total_duration': PROMPT_EVAL_DURATION + EVAL_DURATION
+        })
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _write_chunk(self, data):
+        line = json.dumps(data).encode() + b'\n'
+        self.wfile.write(f'{len(line):x}\r\n'.encode() + line + b'\r\n')
+        self.wfile.flush()
+
+
+@pytest.fixture
+def fake_ollama(monkeypatch):
+    monkeypatch.setattr(benchmark, 'VRAM_POLL_INTERVAL', 0.01)
+    state = FakeOllama()
+    handler = type('Handler', (FakeOllamaHandler,), {'state': state})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield state, f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+
+def test_benchmark_stores_measurements(fake_ollama):
+    state, base_url = fake_ollama
+    prompts = ['one', 'two', 'three']
+
+    results = BenchmarkRunner(OllamaClient(base_url=base_url), prompts=prompts).run([MODEL])
+
+    assert len(results) == 1
+    result = results[0]
+    assert 'error' not in result
+    assert state.unloads == 1
+    assert state.generations == len(prompts)
+
+    host = base_url[len('http://'):]
+    assert result['model_name'] == MODEL
+    assert result['model_digest'] == DIGEST
+    assert result['host'] == host
+    assert result['prompt_count'] == len(prompts)
+    # Only the first prompt after the unload pays for loading the model
+    assert result['load_duration'] == pytest.approx(LOAD_DURATION)
+    assert FIRST_TOKEN_DELAY <= result['time_to_first_token'] < 1
+    assert result['prompt_tokens_per_second'] == pytest.approx(PROMPT_EVAL_COUNT / (PROMPT_EVAL_DURATION / 1e9))
+    assert result['generation_tokens_per_second'] == pytest.approx(EVAL_COUNT / (EVAL_DURATION / 1e9))
+    assert result['peak_vram'] == SIZE_VRAM
+
+    stored = BenchmarkResult.get_results([MODEL], host=host)
+    assert len(stored) == 1
+    assert {key: stored[0][key] for key in ('model_name', 'model_digest', 'host')} == {
+        'model_name': MODEL,
+        'model_digest': DIGEST,
+        'host': host
+    }
+    assert stored[0]['generation_tokens_per_second'] == pytest.approx(result['generation_tokens_per_second'])
+
+
+def test_benchmark_without_cold_start_keeps_model_loaded(fake_ollama):
+    state, base_url = fake_ollama
+    state.loaded = True
+
+    result = BenchmarkRunner(OllamaClient(base_url=base_url), prompts=['one'], cold_start=False).run([MODEL])[0]
+
+    assert state.unloads == 0
+    assert result['load_duration'] == pytest.approx(0.001)
+    assert result['peak_vram'] == SIZE_VRAM
+
+
+def test_benchmark_normalizes_untagged_model_names(fake_ollama):
+    state, base_url = fake_ollama
+    host = base_url[len('http://'):]
+
+    result = BenchmarkRunner(OllamaClient(base_url=base_url), prompts=['one']).run(['llama3'])[0]
+
+    assert result['model_name'] == MODEL
+    assert result['model_digest'] == DIGEST
+    assert result['peak_vram'] == SIZE_VRAM
+    assert BenchmarkResult.get_results(['llama3'], host=host)[0]['model_digest'] == DIGEST
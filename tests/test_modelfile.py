@@ -0,0 +1,108 @@
+from modelfile import parse_modelfile, build_modelfile
+
+MODELFILE = '''# Modelfile generated by "ollama show"
+FROM /root/.ollama/models/blobs/sha256-6a0746a1ec1a
+TEMPLATE """{{ if .System }}<|start_header_id|>system<|end_header_id|>
+
+{{ .System }}<|eot_id|>{{ end }}<|start_header_id|>user<|end_header_id|>
+
+{{ .Prompt }}<|eot_id|>"""
+SYSTEM """
+  You are a helpful assistant.
+  Answer in French.
+"""
+PARAMETER stop "<|start_header_id|>"
+PARAMETER stop "<|end_header_id|>"
+PARAMETER stop <|eot_id|>
+PARAMETER temperature 0.7
+parameter num_ctx 4096
+LICENSE "Meta Llama 3 Community License"
+MESSAGE user """Hello"""
+'''
+
+
+def test_multi_line_template_and_system():
+    modelfile = parse_modelfile(MODELFILE)
+
+    assert modelfile.base == '/root/.ollama/models/blobs/sha256-6a0746a1ec1a'
+    assert modelfile.template == (
+        '{{ if .System }}<|start_header_id|>system<|end_header_id|>\n'
+        '\n'
+        '{{ .System }}<|eot_id|>{{ end }}<|start_header_id|>user<|end_header_id|>\n'
+        '\n'
+        '{{ .Prompt }}<|eot_id|>'
+    )
+    assert modelfile.system == '\n  You are a helpful assistant.\n  Answer in French.\n'
+
+
+def test_repeated_stop_parameters_are_kept_as_a_list():
+    modelfile = parse_modelfile(MODELFILE)
+
+    assert modelfile.parameters['stop'] == ['<|start_header_id|>', '<|end_header_id|>', '<|eot_id|>']
+
+
+def test_quoted_and_bare_values():
+    modelfile = parse_modelfile(MODELFILE)
+
+    assert modelfile.parameters['temperature'] == '0.7'
+    # Instructions are case-insensitive
+    assert modelfile.parameters['num_ctx'] == '4096'
+    assert modelfile.licenses == ['Meta Llama 3 Community License']
+    assert modelfile.messages == [{'role': 'user', 'content': 'Hello'}]
+
+
+def test_single_line_triple_quoted_block():
+    modelfile = parse_modelfile('FROM llama3\nSYSTEM """Be brief."""\n')
+
+    assert modelfile.base == 'llama3'
+    assert modelfile.system == 'Be brief.'
+
+
+def test_unterminated_block_keeps_the_rest_of_the_file():
+    modelfile = parse_modelfile('FROM llama3\nSYSTEM """Line one\nLine two\n')
+
+    assert modelfile.system == 'Line one\nLine two\n'
+
+
+def test_differs_is_false_for_a_round_trip_of_parsed_values():
+    modelfile = parse_modelfile(MODELFILE)
+
+    assert not modelfile.differs(
+        system=modelfile.system,
+        template=modelfile.template,
+        parameters=modelfile.parameters
+    )
+
+
+def test_differs_ignores_surrounding_whitespace():
+    modelfile = parse_modelfile(MODELFILE)
+
+    # The interface sends trimmed values
+    assert not modelfile.differs(
+        system=modelfile.system.strip(),
+        template=modelfile.template.strip(),
+        parameters={'temperature': ' 0.7 ', 'stop': ['<|start_header_id|>', '<|end_header_id|>', '<|eot_id|>']}
+    )
+    assert not modelfile.differs(system='  ', template='')
+
+
+def test_differs_detects_changes():
+    modelfile = parse_modelfile(MODELFILE)
+
+    assert modelfile.differs(system='You are a pirate.')
+    assert modelfile.differs(parameters={'temperature': '0.2'})
+    assert modelfile.differs(parameters={'top_k': '40'})
+    assert modelfile.differs(parameters={'stop': ['<|eot_id|>']})
+
+
+def test_built_modelfile_parses_back_to_the_same_settings():
+    parameters = {'temperature': '0.5', 'stop': ['<|eot_id|>', '</s>']}
+    text = build_modelfile('llama3:latest', system='Line one\nLine two', template='{{ .Prompt }}', parameters=parameters)
+
+    modelfile = parse_modelfile(text)
+
+    assert modelfile.base == 'llama3:latest'
+    assert modelfile.system == 'Line one\nLine two'
+    assert modelfile.template == '{{ .Prompt }}'
+    assert modelfile.parameters == parameters
+    assert not modelfile.differs(system='Line one\nLine two', template='{{ .Prompt }}', parameters=parameters)
@@ -0,0 +1,144 @@
+from models import ModelUsage, EXPORT_COLUMNS
+import csv
+import io
+import json
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+DEFAULT_BATCH_SIZE = int(os.environ.get('OLLAMA_EXPORT_BATCH_SIZE', 5000))
+MAX_BATCH_SIZE = 50000
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet')
+}
+
+
+def parquet_available():
+    return pq is not None
+
+
+def _format_timestamp(timestamp):
+    return timestamp.isoformat() + 'Z' if timestamp else None
+
+
+class _ChunkSink:
+    """Write-only file object collecting what the Parquet writer emits, drained after each row group"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class UsageExport:
+    """Stream raw usage rows as CSV, NDJSON or Parquet.
+
+    The last matching row is fixed when the export is created, so rows
+    logged while it streams are left for the next incremental export,
+    which starts from `watermark_id`. Rows are read `batch_size` at a
+    time and written out batch by batch, so memory use does not grow with
+    the size of the table.
+    """
+
+    def __init__(self, model_names=None, start=None, end=None, after_id=None, since=None,
+                 batch_size=None):
+        self.filters = {'model_names': model_names, 'start': start, 'end': end, 'since': since}
+        self.after_id = after_id
+        self.batch_size = min(batch_size or DEFAULT_BATCH_SIZE, MAX_BATCH_SIZE)
+        last_id, last_timestamp = ModelUsage.export_watermark(after_id=after_id, **self.filters)
+        self.last_id = last_id
+        # Nothing new: hand the caller's watermark back so it can be stored as is
+        self.watermark_id = last_id if last_id is not None else after_id
+        self.watermark_timestamp = last_timestamp if last_timestamp is not None else since
+
+    def batches(self):
+        if self.last_id is None:
+            return iter(())
+        return ModelUsage.iter_export_batches(
+            self.last_id, batch_size=self.batch_size, after_id=self.after_id, **self.filters
+        )
+
+    def headers(self, export_format):
+        extension = EXPORT_FORMATS[export_format][1]
+        headers = {
+            'Content-Disposition': f'attachment; filename="usage-{self.watermark_id or 0}.{extension}"'
+        }
+        if self.watermark_id is not None:
+            headers['X-Export-Watermark-Id'] = str(self.watermark_id)
+        if self.watermark_timestamp is not None:
+            headers['X-Export-Watermark-Timestamp'] = _format_timestamp(self.watermark_timestamp)
+        return headers
+
+    def iter_format(self, export_format):
+        return getattr(self, f'iter_{export_format}')()
+
+    def iter_csv(self):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        yield buffer.getvalue()
+        for batch in self.batches():
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(row[:-1] + (_format_timestamp(row[-1]),) for row in batch)
+            yield buffer.getvalue()
+
+    def iter_ndjson(self):
+        for batch in self.batches():
+            yield ''.join(
+                json.dumps(dict(zip(EXPORT_COLUMNS, row[:-1] + (_format_timestamp(row[-1]),))),
+                           separators=(',', ':')) + '\n'
+                for row in batch
+            )
+
+    def iter_parquet(self):
+        """One Parquet row group per batch, with typed columns and UTC timestamps"""
+        schema = pa.schema([
+            ('id', pa.int64()),
+            ('model_name', pa.string()),
+            ('operation', pa.string()),
+            ('prompt_tokens', pa.int64()),
+            ('completion_tokens', pa.int64()),
+            ('total_duration', pa.float64()),
+            ('timestamp', pa.timestamp('us', tz='UTC'))
+        ])
+        sink = _ChunkSink()
+        writer = pq.ParquetWriter(sink, schema)
+        try:
+            for batch in self.batches():
+                columns = list(zip(*batch))
+                writer.write_table(pa.Table.from_arrays(
+                    [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                    schema=schema
+                ))
+                yield sink.drain()
+        finally:
+            writer.close()
+        yield sink.drain()